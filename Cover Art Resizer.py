@@ -1,102 +1,529 @@
 """
-This script is designed to automatically resize image files in a selected folder.
+This script is designed to automatically resize image files in one or more folders.
 It uses the Python Imaging Library (PIL) to handle image operations.
 
 The script performs the following tasks:
-1. Opens a Windows Explorer prompt to allow the user to select a folder.
-2. Checks for a subfolder named "resized" within the selected folder. If it doesn't exist, the script creates one.
-3. Loops through each image file in the selected folder and resizes it to 500x750 pixels.
-4. Saves the resized image in the "resized" subfolder with "_resized" appended to the original filename.
+1. Takes the folders to resize from the command line, or opens a Windows Explorer prompt to select a folder
+   when none are given.
+2. Checks for a subfolder named "resized" within each folder. If it doesn't exist, the script creates one.
+   A manifest in that folder remembers the size, modification time and content hash of every processed image,
+   so reruns only process new or replaced images and report resized images whose source was removed.
+3. Streams the image files in the folder and resizes each one to 500x750 pixels, spreading the
+   decode/resize/encode work over a pool of processes (one per CPU core by default). Large JPEGs are
+   decoded directly at 1/2, 1/4 or 1/8 scale (JPEG draft mode) when that is still bigger than the target.
+   Extra sizes and formats (thumbnails, WebP/AVIF variants) can be passed with --output; each image is
+   decoded once and saved in every output, stretched, fitted or cropped to the output size.
+4. Saves the resized image in the "resized" subfolder with "_resized" (the output suffix) appended to the original filename.
 5. Prints the names of the files that have been resized.
-6. Prints the total number of files resized at the end.
+6. Prints the total number of files resized at the end, along with the throughput (images/s and MB/s).
 
 Supported image formats: JPEG, JPG, PNG, BMP, TIFF, GIF
 
-The script includes a function called 'resize_images' which accepts an 'extension' parameter.
-Only images with the provided extension will be resized.
+The script includes a function called 'resize_images' which accepts a 'folder' and an 'extension' parameter.
+Only images with the provided extension will be resized. It can be used without a display, e.g. from cron:
+
+    python "Cover Art Resizer.py" /posters/movies /posters/shows --output thumb:150x225:webp:fit
+
+Run the script with "--benchmark" to compare the full decode and the reduced-size decode on a generated corpus.
 """
 
+import argparse
+import hashlib
+import io
 import os
-from tkinter import filedialog
-from tkinter import Tk
-from PIL import Image
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from PIL import Image, ImageOps
 
-import os
-from PIL import Image
+# Supported image file formats for PIL
+supported_formats = ["JPEG", "JPG", "PNG", "BMP", "TIFF", "GIF"]
+
+# Outputs produced from every source image, each decoded only once: (suffix, (width, height), format, mode)
+# - format None keeps the source format, otherwise one of the keys of format_extensions (e.g. "WEBP")
+# - mode "stretch" resizes to exactly the given size, "fit" keeps the aspect ratio inside the size and
+#   "crop" keeps the aspect ratio and crops the overflow so the result fills the size
+default_outputs = [
+    ("resized", (500, 750), None, "stretch"),
+]
+
+# File extensions used for the output formats
+format_extensions = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "AVIF": "avif", "BMP": "bmp", "TIFF": "tif", "GIF": "gif"}
+
+# Resize modes supported by the outputs
+resize_modes = ["stretch", "fit", "crop"]
+
+# Number of jobs queued per worker process, so the pool never starves while the folder is still being listed
+jobs_per_worker = 4
 
-def resize_images(extension):
+# Reduced-size decoding is only used when the source is at least this many times larger than the target
+draft_min_ratio = 2
+
+# Manifest of processed images, kept in the "resized" folder
+manifest_name = "resize_manifest.sqlite"
+
+
+def decode_reduced(image, size):
     """
-    Resizes images with the specified extension.
+    Asks the decoder to produce a smaller image when the source is much larger than the requested size.
+
+    For JPEG files this uses draft mode, which makes libjpeg decode directly at 1/2, 1/4 or 1/8 scale while
+    keeping the result at least as large as the requested size. Other formats are left untouched and are
+    fully decoded as before.
 
     Args:
-        extension (str): The file extension of the images to be resized.
+        image (PIL.Image.Image): The opened, not yet loaded, image.
+        size (tuple): The (width, height) the image will be resized to.
 
     Returns:
-        None
+        bool: True if a reduced-size decode was configured, False if the full decode is used.
     """
-    # Initialize counter for resized files
-    resized_count = 0
+    if image.format != "JPEG":
+        return False
+
+    if image.width < size[0] * draft_min_ratio or image.height < size[1] * draft_min_ratio:
+        return False
+
+    return image.draft(image.mode, size) is not None
+
+
+def output_filename(filename, output):
+    """
+    Builds the name of one output of a source image, e.g. "poster.jpg" -> "poster_resized.jpg".
+
+    Args:
+        filename (str): The name of the source image.
+        output (tuple): The output as (suffix, size, format, mode).
+
+    Returns:
+        str: The name of the output file.
+    """
+    suffix, _, image_format, _ = output
+    file_name_parts = filename.rsplit('.', 1)
+    extension = format_extensions[image_format] if image_format else file_name_parts[1]
+    return f"{file_name_parts[0]}_{suffix}.{extension}"
+
+
+def output_profile(outputs):
+    """
+    Describes a list of outputs as a string, so the manifest can tell when the outputs were changed.
+
+    Args:
+        outputs (list): The outputs as (suffix, size, format, mode) tuples.
+
+    Returns:
+        str: The description of the outputs.
+    """
+    return ";".join(f"{suffix}:{size[0]}x{size[1]}:{image_format or ''}:{mode}"
+                    for suffix, size, image_format, mode in outputs)
+
+
+def render_output(image, size, mode):
+    """
+    Resizes a decoded image to one output size.
+
+    Args:
+        image (PIL.Image.Image): The decoded source image.
+        size (tuple): The (width, height) of the output.
+        mode (str): "stretch", "fit" or "crop".
+
+    Returns:
+        PIL.Image.Image: The resized image.
+    """
+    if mode == "fit":
+        return ImageOps.contain(image, size, Image.LANCZOS)
+    if mode == "crop":
+        return ImageOps.fit(image, size, Image.LANCZOS)
+    return image.resize(size, Image.LANCZOS)
+
+
+def resize_image_file(file_path, targets, use_draft=True, previous_hash=None):
+    """
+    Decodes a single image file once and saves every output. Runs inside a worker process.
+
+    The file is read once; its bytes are hashed and then decoded from memory. When the hash matches the
+    one recorded in the manifest and the outputs are still there, the image is not decoded at all.
+
+    Args:
+        file_path (str): The path of the image to be resized.
+        targets (list): The outputs as (new_file_path, size, format, mode) tuples.
+        use_draft (bool): Whether large JPEGs may be decoded at a reduced size.
+        previous_hash (str): The content hash recorded for this file on a previous run, if any.
+
+    Returns:
+        tuple: (status, content_hash) where status is "resized", "unchanged" or "unsupported".
+    """
+    with open(file_path, 'rb') as source:
+        data = source.read()
+    content_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    # The file was touched but its content is the same, so the existing outputs are still valid
+    if content_hash == previous_hash and all(os.path.exists(target[0]) for target in targets):
+        return "unchanged", content_hash
+
+    # Open image using PIL
+    with Image.open(io.BytesIO(data)) as image:
+        # Check if the image format is supported
+        if image.format.upper() not in supported_formats:
+            return "unsupported", content_hash
+
+        # Decode once, large enough for the biggest output
+        if use_draft:
+            decode_reduced(image, (max(target[1][0] for target in targets), max(target[1][1] for target in targets)))
+        image.load()
+
+        for new_file_path, size, image_format, mode in targets:
+            resized_image = render_output(image, size, mode)
+            if (image_format or image.format) == "JPEG" and resized_image.mode not in ("RGB", "L", "CMYK"):
+                resized_image = resized_image.convert("RGB")
+            resized_image.save(new_file_path, format=image_format)
+
+    return "resized", content_hash
+
+
+def open_manifest(destination):
+    """
+    Opens (and creates if needed) the manifest of processed images stored in the resized folder.
+
+    Args:
+        destination (str): The folder the resized images are saved to.
+
+    Returns:
+        sqlite3.Connection: The connection to the manifest database.
+    """
+    connection = sqlite3.connect(os.path.join(destination, manifest_name))
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS images ("
+        "name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT, output TEXT, profile TEXT)"
+    )
+
+    # Manifests written before multiple outputs were supported don't have the profile column yet
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(images)")]
+    if "profile" not in columns:
+        connection.execute("ALTER TABLE images ADD COLUMN profile TEXT")
+        connection.execute("UPDATE images SET profile = ?", (output_profile(default_outputs[:1]),))
+    return connection
+
+
+def plan_resize_jobs(folder, destination, extension, outputs, manifest, stats):
+    """
+    Streams the files of a folder and yields the ones that are new or changed since the last run.
+
+    The folder is read with os.scandir, so entries are produced as the directory is listed instead of
+    materializing the whole listing first. The size and modification time from the directory entry are
+    compared with the manifest, so unchanged images are skipped without being opened. Images are also
+    processed again when the list of outputs changed since they were last resized.
+
+    Args:
+        folder (str): The folder containing the source images.
+        destination (str): The folder the resized images are saved to.
+        extension (str): The file extension of the images to be resized.
+        outputs (list): The outputs as (suffix, size, format, mode) tuples.
+        manifest (dict): The manifest records keyed by file name, as (size, mtime_ns, hash, output, profile).
+        stats (dict): Updated while planning: the "seen" file names, the "unchanged" count and the "adopted"
+            manifest rows for resized files left by runs that predate the manifest.
+
+    Yields:
+        tuple: (filename, file_path, new_filenames, targets, file_size, mtime_ns, previous_hash)
+    """
+    profile = output_profile(outputs)
 
-    # Loop through each file in the selected folder
-    for filename in os.listdir(folder_selected):
-        try:
+    # Read the resized folder once instead of checking every output path separately
+    existing = {entry.name: entry for entry in os.scandir(destination)}
+
+    with os.scandir(folder) as entries:
+        for entry in entries:
             # Skip files that don't have the specified extension
-            if not filename.lower().endswith(extension.lower()):
+            if not entry.name.lower().endswith(extension.lower()) or not entry.is_file():
                 continue
 
-            # Generate full file path
-            file_path = os.path.join(folder_selected, filename)
+            stats["seen"].add(entry.name)
+
+            # Generate new file names and save paths
+            new_filenames = [output_filename(entry.name, output) for output in outputs]
+            found = [existing.get(new_filename) for new_filename in new_filenames]
+            all_found = all(output is not None for output in found)
 
-            # Generate new file name and save path
-            file_name_parts = filename.rsplit('.', 1)
-            new_filename = f"{file_name_parts[0]}_resized.{file_name_parts[1]}"
-            new_file_path = os.path.join(resized_folder, new_filename)
+            file_stat = entry.stat()
+            record = manifest.get(entry.name)
+            same_profile = record is not None and record[4] == profile
 
-            # Check if resized file already exists
-            if os.path.exists(new_file_path):
-                print(f"Skipped: {new_filename} already exists.")
+            if same_profile and all_found and record[:2] == (file_stat.st_size, file_stat.st_mtime_ns):
+                stats["unchanged"] += 1
                 continue
 
-            # Open image using PIL
-            with Image.open(file_path) as image:
-                # Check if the image format is supported
-                if image.format.upper() in supported_formats:
-                    # Resize the image to 500x750
-                    resized_image = image.resize((500, 750), Image.ANTIALIAS)
+            # Resized by a run that predates the manifest: keep it unless the source is newer than the outputs
+            if record is None and all_found and all(output.stat().st_mtime_ns >= file_stat.st_mtime_ns for output in found):
+                print(f"Skipped: {', '.join(new_filenames)} already exists.")
+                stats["adopted"].append((entry.name, file_stat.st_size, file_stat.st_mtime_ns, None,
+                                         "|".join(new_filenames), profile))
+                continue
+
+            targets = [(os.path.join(destination, new_filename), size, image_format, mode)
+                       for new_filename, (_, size, image_format, mode) in zip(new_filenames, outputs)]
+            previous_hash = record[2] if same_profile else None
+            yield (entry.name, entry.path, new_filenames, targets,
+                   file_stat.st_size, file_stat.st_mtime_ns, previous_hash)
+
+
+def resize_images(folder, extension=".jpg", outputs=None, workers=None, use_draft=True, prune_stale=False,
+                  executor=None):
+    """
+    Resizes new or changed images with the specified extension using a pool of worker processes.
 
-                    # Save the resized image
-                    resized_image.save(new_file_path)
+    Every image is decoded once and saved in each of the configured outputs, in the "resized" subfolder of
+    the given folder. A manifest in the resized folder records the size, modification time and content hash
+    of every processed image, so reruns only open images that were added or replaced. Resized images whose
+    source is gone are reported as stale.
 
-                    # Print the name of the resized file
-                    print(f"Resized: {new_filename}")
+    Args:
+        folder (str): The folder containing the source images.
+        extension (str): The file extension of the images to be resized.
+        outputs (list): The outputs as (suffix, size, format, mode) tuples. Defaults to the 500x750 "_resized" image.
+        workers (int): The number of worker processes. Defaults to the number of CPU cores.
+        use_draft (bool): Whether large JPEGs may be decoded at a reduced size.
+        prune_stale (bool): Whether stale resized images are deleted instead of only reported.
+        executor (concurrent.futures.Executor): A pool to reuse across folders. A new one is created when omitted.
 
-                    # Increment the counter
-                    resized_count += 1
+    Returns:
+        dict: The counts of "resized", "unchanged" and "stale" images and the "elapsed" time in seconds.
+    """
+    outputs = outputs or default_outputs
+    for suffix, _, image_format, mode in outputs:
+        if mode not in resize_modes:
+            raise ValueError(f"Unknown resize mode for output {suffix}: {mode}")
+        if image_format and image_format not in format_extensions:
+            raise ValueError(f"Unknown format for output {suffix}: {image_format}")
 
-        except Exception as e:
-            # Print error message if something goes wrong
-            print(f"Error resizing {filename}: {e}")
+    # Check if there is a folder named "resized" in the directory
+    resized_folder = os.path.join(folder, "resized")
+    os.makedirs(resized_folder, exist_ok=True)
 
-    # Print the total number of resized files
-    print(f"Total number of files resized: {resized_count}")
+    # Initialize counters for resized files
+    resized_count = 0
+    resized_bytes = 0
+    workers = workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+    profile = output_profile(outputs)
 
-# Initialize the Tkinter window, but don't show it
-root = Tk()
-root.withdraw()
+    connection = open_manifest(resized_folder)
+    manifest = {row[0]: row[1:] for row in
+                connection.execute("SELECT name, size, mtime_ns, hash, output, profile FROM images")}
+    stats = {"seen": set(), "unchanged": 0, "adopted": []}
+    updates = []
 
-# Open Windows Explorer prompt to select folder
-folder_selected = filedialog.askdirectory()
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
 
-# Supported image file formats for PIL
-supported_formats = ["JPEG", "JPG", "PNG", "BMP", "TIFF", "GIF"]
+    try:
+        pending = {}
+
+        def collect(done):
+            nonlocal resized_count, resized_bytes
+            for future in done:
+                filename, new_filenames, file_size, mtime_ns = pending.pop(future)
+                try:
+                    status, content_hash = future.result()
+                    if status == "resized":
+                        # Print the names of the resized files
+                        print(f"Resized: {', '.join(new_filenames)}")
+                        resized_count += 1
+                        resized_bytes += file_size
+                    elif status == "unchanged":
+                        stats["unchanged"] += 1
+                    if status != "unsupported":
+                        updates.append((filename, file_size, mtime_ns, content_hash, "|".join(new_filenames), profile))
+                except Exception as e:
+                    # Print error message if something goes wrong
+                    print(f"Error resizing {filename}: {e}")
+
+        for filename, file_path, new_filenames, targets, file_size, mtime_ns, previous_hash in plan_resize_jobs(
+                folder, resized_folder, extension, outputs, manifest, stats):
+            future = executor.submit(resize_image_file, file_path, targets, use_draft, previous_hash)
+            pending[future] = (filename, new_filenames, file_size, mtime_ns)
+
+            # Keep a bounded number of jobs in flight while the folder is being streamed
+            if len(pending) >= workers * jobs_per_worker:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        collect(wait(pending).done)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    # Report resized images whose source no longer exists
+    stale = [(name, record[3]) for name, record in manifest.items()
+             if name not in stats["seen"] and name.lower().endswith(extension.lower())]
+    for name, output in stale:
+        for new_filename in output.split("|"):
+            if prune_stale:
+                try:
+                    os.remove(os.path.join(resized_folder, new_filename))
+                except FileNotFoundError:
+                    pass
+                print(f"Removed stale: {new_filename} ({name} no longer exists)")
+            else:
+                print(f"Stale: {new_filename} ({name} no longer exists)")
+
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)", stats["adopted"] + updates)
+        if prune_stale:
+            connection.executemany("DELETE FROM images WHERE name = ?", [(name,) for name, _ in stale])
+    connection.close()
+
+    elapsed = time.perf_counter() - start_time
+
+    # Print the total number of resized files and the throughput
+    print(f"Total number of files resized: {resized_count} ({len(outputs)} outputs each)")
+    print(f"Unchanged files skipped: {stats['unchanged']}, stale resized files: {len(stale)}")
+    if elapsed > 0:
+        print(f"Throughput: {resized_count / elapsed:.1f} images/s, "
+              f"{resized_bytes / (1024 * 1024) / elapsed:.1f} MB/s ({elapsed:.1f}s with {workers} workers)")
+
+    return {"resized": resized_count, "unchanged": stats["unchanged"], "stale": len(stale), "elapsed": elapsed}
+
+
+def benchmark_decode_paths(count=40, source_size=(2000, 3000)):
+    """
+    Compares the full decode with the reduced-size decode on a generated corpus of JPEG posters.
+
+    Both paths resize the same files on a single core, so the CPU time is directly comparable. The decoded
+    buffer size shows how much pixel memory each path needs per image before the resize.
+
+    Args:
+        count (int): The number of posters to generate.
+        source_size (tuple): The (width, height) of the generated posters.
+
+    Returns:
+        None
+    """
+    with tempfile.TemporaryDirectory() as corpus:
+        print(f"Generating {count} posters of {source_size[0]}x{source_size[1]} in {corpus}...")
+        for index in range(count):
+            poster = Image.effect_noise(source_size, 48).convert("RGB")
+            poster.save(os.path.join(corpus, f"poster_{index}.jpg"), quality=90)
+
+        for label, use_draft in (("Full decode", False), ("Reduced decode", True)):
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+
+            for index in range(count):
+                file_path = os.path.join(corpus, f"poster_{index}.jpg")
+                targets = [(os.path.join(corpus, output_filename(f"poster_{index}.jpg", output)),) + output[1:]
+                           for output in default_outputs]
+                resize_image_file(file_path, targets, use_draft)
+
+            cpu_time = time.process_time() - cpu_start
+            wall_time = time.perf_counter() - wall_start
+
+            # Measure the decoded buffer separately so it doesn't count towards the timings
+            with Image.open(os.path.join(corpus, "poster_0.jpg")) as image:
+                if use_draft:
+                    decode_reduced(image, default_outputs[0][1])
+                image.load()
+                decoded_bytes = image.width * image.height * len(image.getbands())
+
+            print(f"{label}: {cpu_time:.2f}s CPU, {wall_time:.2f}s wall, "
+                  f"{count / wall_time:.1f} images/s, {decoded_bytes / (1024 * 1024):.1f} MB decoded per image")
+
+
+def parse_output(spec):
+    """
+    Parses an output given on the command line as SUFFIX:WIDTHxHEIGHT[:FORMAT[:MODE]].
+
+    Args:
+        spec (str): The output, e.g. "thumb:150x225:webp:fit". An empty format keeps the source format.
+
+    Returns:
+        tuple: The output as (suffix, size, format, mode).
+    """
+    parts = spec.split(":")
+    if len(parts) < 2 or len(parts) > 4:
+        raise argparse.ArgumentTypeError(f"Expected SUFFIX:WIDTHxHEIGHT[:FORMAT[:MODE]], got {spec}")
+
+    try:
+        width, height = (int(value) for value in parts[1].lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size in output {spec}")
+
+    image_format = parts[2].upper() if len(parts) > 2 and parts[2] else None
+    if image_format == "JPG":
+        image_format = "JPEG"
+    if image_format and image_format not in format_extensions:
+        raise argparse.ArgumentTypeError(f"Unknown format in output {spec}")
+
+    mode = parts[3].lower() if len(parts) > 3 else "stretch"
+    if mode not in resize_modes:
+        raise argparse.ArgumentTypeError(f"Unknown resize mode in output {spec}")
+
+    return parts[0], (width, height), image_format, mode
+
+
+def choose_folder():
+    """
+    Opens a Windows Explorer prompt to select a folder. Tkinter is only imported when the prompt is needed.
+
+    Returns:
+        str: The selected folder, or an empty string if the prompt was cancelled.
+    """
+    from tkinter import filedialog
+    from tkinter import Tk
+
+    # Initialize the Tkinter window, but don't show it
+    root = Tk()
+    root.withdraw()
+    folder_selected = filedialog.askdirectory()
+    root.destroy()
+    return folder_selected
+
+
+def main(argv=None):
+    """
+    Command-line entry point. Resizes every given folder with one shared process pool, or asks for a folder
+    with the Explorer prompt when none is given.
+
+    Args:
+        argv (list): The command-line arguments. Defaults to sys.argv.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description="Resize cover art images.")
+    parser.add_argument("folders", nargs="*", help="Folders to resize. Opens a folder prompt when omitted.")
+    parser.add_argument("--extension", default=".jpg", help="Only resize files with this extension (default: .jpg).")
+    parser.add_argument("--output", action="append", type=parse_output, dest="outputs",
+                        help="Output as SUFFIX:WIDTHxHEIGHT[:FORMAT[:MODE]], e.g. thumb:150x225:webp:fit. "
+                             "Can be repeated. Defaults to resized:500x750.")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: one per CPU core).")
+    parser.add_argument("--no-draft", action="store_true", help="Always fully decode JPEGs.")
+    parser.add_argument("--prune-stale", action="store_true", help="Delete resized images whose source is gone.")
+    parser.add_argument("--benchmark", action="store_true", help="Compare the full and reduced JPEG decode paths.")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark_decode_paths()
+        return 0
+
+    folders = args.folders
+    if not folders:
+        folder_selected = choose_folder()
+        if not folder_selected:
+            return 1
+        folders = [folder_selected]
+
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for folder in folders:
+            # Print selected folder
+            print(f"Selected folder: {folder}")
+            resize_images(folder, args.extension, args.outputs, workers, not args.no_draft, args.prune_stale, executor)
 
-# Check if there is a folder named "resized" in the directory
-resized_folder = os.path.join(folder_selected, "resized")
-if not os.path.exists(resized_folder):
-    os.makedirs(resized_folder)
+    return 0
 
-# Print selected folder
-print(f"Selected folder: {folder_selected}")
 
-# Call the resize_images function and specify the extension you want to filter by, for example ".jpg"
-resize_images(".jpg")
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,37 +7,114 @@
 # 
 # 1. "Execute" Button: Starts the process of moving folders from the source to the destination.
 # It only moves folders that don't have certain keywords or file extensions in their names
-# (like "mkv", "1080p", etc.). It also shows a progress bar and a percentage counter indicating 
-# how much of each file has been moved.
+# (like "mkv", "1080p", etc., configurable in folder_filter.json). It also shows a progress bar and a
+# percentage counter indicating how much has been moved.
 # 
-# 2. "Rename" Button: Executes another Python script that renames existing folders in a specified way.
+# 2. "Rename" Button: Renames the folders of the source folder to "Title (Year)", using the
+# "Rename Existing Folders.py" script next to this one.
+# 
+# "Plan" Button: Lists what "Execute" would move and where, and why the other folders would be skipped,
+# without moving anything.
+# 
+# "Auto-place across drives": instead of moving everything to the chosen destination, folders are spread
+# across all the drives of the same kind (e.g. every "HD Movies" share), by free space, so the drives fill
+# evenly. Folders that don't fit anywhere are left in place.
 # 
 # 3. Progress Bar: As folders are being moved, a progress bar fills up to show the status of the transfer.
 # 
 # 4. Percentage Counter: Next to the progress bar, a percentage counter updates in real-time to show
-# the progress of each individual file being moved.
+# the overall progress of the transfer.
 # 
 # 5. Log Box: Below the progress bar, a text box shows log messages that provide additional information
 # about the process, such as which file is currently being moved.
 # 
-# 6. Current File Label: A label at the bottom displays the name of the file currently being moved.
+# 6. Status Label: A label at the bottom shows how many folders are being moved, how many are done
+# and the combined transfer speed.
+# 
+# Several folders are moved at the same time ("Parallel folders"), with a limit per destination drive,
+# smallest folders first unless "Smallest first" is unticked. With "Verify copies" ticked, every copied
+# file is checked against the original before the original is deleted.
 # 
 # The script uses multi-threading to ensure that the GUI remains responsive during the transfer process.
 
 
 
 
+import argparse
+import errno
+import hashlib
+import json
 import os
+import random
 import re
 import shutil
+import sys
+import tempfile
+import time
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
 import threading
-import subprocess
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 import tkinter.filedialog as filedialog
 
+# Chunk size of the copy engine; large chunks keep network shares busy
+copy_buffer_size = 16 * 1024 * 1024
+
+# Maximum number of progress updates per second sent to the window
+progress_updates_per_second = 10
+
+folder_filter = None
+
+# Free space is read at most once per share every free_space_ttl seconds. Auto-placement leaves at least
+# placement_reserve_bytes free on every drive.
+free_space_ttl = 30
+placement_reserve_bytes = 10 * 1024 ** 3
+disk_usage_cache = {}
+disk_usage_lock = threading.Lock()
+
+# Copies are flushed to disk and checkpointed in the folder's journal every this many bytes
+checkpoint_bytes = 256 * 1024 * 1024
+
+# Folders are copied into "<name>.partial" and renamed into place once complete; the copy's
+# progress is journaled in "<name>.partial.journal" next to it
+partial_suffix = ".partial"
+journal_suffix = ".journal"
+
+# Folders moved at once, and at most this many to the same share
+max_concurrent_transfers = 4
+per_destination_transfers = 2
+
+# Optional bandwidth caps in bytes per second, per share, e.g. {"\\\\192.168.1.145\\e": 200 * 1024 * 1024}
+destination_bandwidth_limits = {}
+
+# Move the smallest folders first so the queue drains predictably
+transfer_smallest_first = True
+
+# Folders with one of these words in their name (release tags, file extensions) are left alone. Names are
+# split into words first, so "ts" matches "Movie.TS" but not "Avengers". The lists and the required name
+# pattern can be changed in folder_filter.json next to this script, e.g. {"keywords": [...], "extensions":
+# [...], "name_pattern": "..."}; keys that are left out keep these defaults.
+filter_keywords = ["dolby", "bluray", "dvdrip", "remux", "avc", "truehd", "atmos", "dts", "fgt", "hdtv",
+                   "remastered", "dvd", "rarbg", "1080p", "720p", "480p", "360p", "1440p", "2k", "4k", "m4k", "heiv"]
+filter_extensions = ["mkv", "mov", "mp4", "avi", "mpg", "mpeg", "m4v", "wmv", "ts", "m2ts", "flv", "divx"]
+folder_name_pattern = r".+ \(\d{4}\)$"
+filter_config_name = "folder_filter.json"
+
+# Hash every copied file on both sides before deleting the source. xxHash is used when the xxhash
+# package is installed, BLAKE2b otherwise; the hashes are kept in a sidecar file in the moved folder
+# that "xxh128sum -c" / "b2sum -c" can check later.
+verify_copies = True
+checksum_algorithm = "xxh128" if xxhash else "blake2b"
+checksum_manifest_name = "checksums." + checksum_algorithm
+
 def browse_folder(combo_box):
     """
     Browse the folder and set the selected folder in the combo box.
@@ -53,51 +130,861 @@ def browse_folder(combo_box):
     print("Folder selected:", folder_selected)
     combo_box.set(folder_selected)
 
-def copy_with_progress(src, dest, progress_bar, progress_label, max_value, current_file_label):
+def throttle(callback, per_second=None):
+    """
+    Wraps a progress callback so it runs at most per_second times per second. The final call (copied == total)
+    always goes through, so the progress always ends at 100%.
+
+    Args:
+        callback (callable): Called with (copied, total) byte counts, followed by any extra arguments.
+        per_second (float): The maximum number of calls per second. Defaults to progress_updates_per_second.
+
+    Returns:
+        callable: The throttled callback.
     """
-    Copies a file from the source path to the destination path with a progress bar and labels.
-    
+    interval = 1.0 / (per_second or progress_updates_per_second)
+    last_call = [0.0]
+
+    def throttled(copied, total, *args):
+        now = time.monotonic()
+        if copied >= total or now - last_call[0] >= interval:
+            last_call[0] = now
+            callback(copied, total, *args)
+
+    return throttled
+
+def copy_file(src, dest, progress=None, buffer_size=None, offset=0, checkpoint=None):
+    """
+    Copies a file using the fastest method the OS offers, reporting progress between chunks.
+
+    On Linux the data is copied inside the kernel with os.copy_file_range (or os.sendfile), without passing
+    through Python. Elsewhere, or when the kernel refuses (e.g. across filesystems on older kernels) or stops
+    short of the end, the rest of the file is copied with readinto into one large reusable buffer.
+
     Args:
-        src (str): The path of the source file to be copied.
+        src (str): The path of the source file.
         dest (str): The path of the destination file.
-        progress_bar (tkinter.ttk.Progressbar): The progress bar widget that shows the copying progress.
-        progress_label (tkinter.Label): The label widget that shows the copying progress percentage.
-        max_value (int): The maximum value of the progress bar.
-        current_file_label (tkinter.Label): The label widget that shows the name of the current file being copied.
-    
+        progress (callable): Called with (copied, total) after every chunk; wrap it with throttle() for GUI updates.
+        buffer_size (int): The chunk size in bytes. Defaults to copy_buffer_size.
+        offset (int): Resume a copy: the first offset bytes are already in dest and are kept.
+        checkpoint (callable): Called with the number of bytes copied every checkpoint_bytes, once those
+            bytes have been flushed to disk, so a journal can record them as safe to resume from.
+
     Returns:
-        None
+        int: The number of bytes copied, including the offset.
+
+    Raises:
+        OSError: If the copy doesn't end up the size the source had when it was opened (e.g. the source
+            changed during the copy).
     """
-    with open(src, 'rb') as fsrc, open(dest, 'wb') as fdest:
-        total_size = os.path.getsize(src)
-        copied_size = 0
-        chunk_size = 1024 * 1024
+    buffer_size = buffer_size or copy_buffer_size
+    with open(src, 'rb') as fsrc, open(dest, 'r+b' if offset else 'wb') as fdest:
+        total_size = os.fstat(fsrc.fileno()).st_size
+        fdest.truncate(offset)
+        fdest.seek(offset)
+        copied_size = offset
+        next_checkpoint = [offset + checkpoint_bytes]
+        if progress and not total_size:
+            progress(0, 0)
+
+        def chunk_copied():
+            if checkpoint and copied_size >= next_checkpoint[0]:
+                fdest.flush()
+                os.fsync(fdest.fileno())
+                checkpoint(copied_size)
+                next_checkpoint[0] = copied_size + checkpoint_bytes
+            if progress:
+                progress(copied_size, total_size)
+
+        for kernel_copy in kernel_copy_functions():
+            try:
+                fdest.seek(copied_size)
+                while True:
+                    count = kernel_copy(fsrc.fileno(), fdest.fileno(), copied_size, buffer_size)
+                    if not count:
+                        break
+                    copied_size += count
+                    chunk_copied()
+                # Some filesystems stop copying early without an error; the next method copies the rest
+                if copied_size >= total_size:
+                    break
+            except OSError as e:
+                # Nothing written yet: try the next method. Otherwise it's a real I/O error.
+                if copied_size > offset or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP):
+                    raise
+
+        else:
+            fsrc.seek(copied_size)
+            fdest.seek(copied_size)
+            buf = bytearray(buffer_size)
+            view = memoryview(buf)
+            while True:
+                count = fsrc.readinto(buf)
+                if not count:
+                    break
+                fdest.write(view[:count])
+                copied_size += count
+                chunk_copied()
+
+    if copied_size != total_size:
+        raise OSError(f"Copied {copied_size} of {total_size} bytes of {src}; the file changed or the copy was cut short")
+    return copied_size
+
+def kernel_copy_functions():
+    """
+    Returns the in-kernel copy functions available on this OS, as f(src_fd, dest_fd, offset, count) -> bytes copied.
+    """
+    functions = []
+    if hasattr(os, 'copy_file_range'):
+        functions.append(lambda src_fd, dest_fd, offset, count: os.copy_file_range(src_fd, dest_fd, count, offset, offset))
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        # sendfile writes at the destination's current position, which follows the bytes copied so far
+        functions.append(lambda src_fd, dest_fd, offset, count: os.sendfile(dest_fd, src_fd, offset, count))
+    return functions
+
+def same_device(path, other_path):
+    """
+    Returns True if both paths are on the same filesystem (same st_dev), so a folder can be renamed
+    from one to the other instead of copied.
+    """
+    try:
+        return os.stat(path).st_dev == os.stat(other_path).st_dev
+    except OSError:
+        return False
+
+def move_by_rename(folder_path, dest_path):
+    """
+    Moves a folder with a single atomic rename.
+
+    Args:
+        folder_path (str): The folder to move.
+        dest_path (str): The new path of the folder.
+
+    Returns:
+        bool: True if the folder was moved, False if the OS refused because the paths are on different
+        devices after all (e.g. two shares that report the same volume), in which case it must be copied.
+    """
+    try:
+        os.rename(folder_path, dest_path)
+        return True
+    except OSError as e:
+        # EXDEV on POSIX, ERROR_NOT_SAME_DEVICE (17) on Windows
+        if e.errno == errno.EXDEV or getattr(e, 'winerror', None) == 17:
+            return False
+        raise
+
+def log_message(log_text, message):
+    """
+    Prints a message and appends it to the log box, if any. Safe to call from worker threads: the widget is
+    updated on the Tk main loop.
+    """
+    print(message)
+    if log_text is None:
+        return
+
+    def append():
+        log_text.insert(tk.END, message + "\n")
+        log_text.yview(tk.END)
+
+    log_text.after(0, append)
+
+def folder_size(folder_path):
+    """
+    Returns the total size in bytes of the files in a folder and its subfolders.
+    """
+    total_size = 0
+    pending = [folder_path]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                else:
+                    total_size += entry.stat(follow_symlinks=False).st_size
+    return total_size
+
+def destination_share(path):
+    """
+    Returns the share (e.g. \\\\192.168.1.145\\e) or drive a destination path is on. Transfers to the same
+    share compete for the same disk, so concurrency and bandwidth limits are applied per share.
+    """
+    drive = os.path.splitdrive(path)[0]
+    return drive or os.path.dirname(os.path.normpath(path))
+
+def make_rate_limiter(bytes_per_second):
+    """
+    Returns a function that sleeps as needed so that the bytes passed to it, across all threads sharing the
+    limiter, don't exceed bytes_per_second on average.
+    """
+    lock = threading.Lock()
+    next_free = [time.monotonic()]
+
+    def consume(byte_count):
+        with lock:
+            now = time.monotonic()
+            start = max(now, next_free[0])
+            next_free[0] = start + byte_count / bytes_per_second
+            delay = next_free[0] - now
+        if delay > 0:
+            time.sleep(delay)
+
+    return consume
+
+def compile_folder_filter(keywords=None, extensions=None, name_pattern=None):
+    """
+    Compiles the folder name rules once into a classifier.
+
+    The name is lowercased and split into words (runs of letters and digits), and every word is looked up
+    in one set of blocked words. Keywords of several words (e.g. "web-dl") must appear as consecutive words.
+
+    Args:
+        keywords (list): Release keywords. Defaults to filter_keywords.
+        extensions (list): File extensions, with or without the dot. Defaults to filter_extensions.
+        name_pattern (str): The regex the whole name must match. Defaults to folder_name_pattern.
+
+    Returns:
+        callable: classify(name), which returns why the folder must not be moved, or None if it can be.
+    """
+    split_words = re.compile(r"[a-z0-9]+").findall
+    blocked = {}
+    phrases = []
+    for kind, words in (("file extension", extensions or filter_extensions), ("release keyword", keywords or filter_keywords)):
+        for word in words:
+            tokens = split_words(word.lower())
+            if len(tokens) == 1:
+                blocked[tokens[0]] = kind
+            elif tokens:
+                phrases.append((" " + " ".join(tokens) + " ", kind, word))
+    match_name = re.compile(name_pattern or folder_name_pattern).match
+
+    def classify(name):
+        tokens = split_words(name.lower())
+        for token in tokens:
+            kind = blocked.get(token)
+            if kind:
+                return f"{kind} '{token}'"
+        if phrases:
+            joined = " " + " ".join(tokens) + " "
+            for phrase, kind, word in phrases:
+                if phrase in joined:
+                    return f"{kind} '{word}'"
+        if not match_name(name):
+            return 'not named "Title (Year)"'
+        return None
+
+    return classify
+
+def get_folder_filter():
+    """
+    Returns the folder classifier, compiled on first use from the defaults and folder_filter.json.
+    """
+    global folder_filter
+    if folder_filter is None:
+        rules = {}
+        config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filter_config_name)
+        if os.path.exists(config_path):
+            with open(config_path, encoding='utf-8') as config:
+                rules = json.load(config)
+            print(f"Loaded folder filter from {config_path}")
+        folder_filter = compile_folder_filter(rules.get('keywords'), rules.get('extensions'), rules.get('name_pattern'))
+    return folder_filter
+
+def classify_folders(src_folder, dest_folder, classify=None):
+    """
+    Decides for every entry of the source folder whether it should be moved to the destination folder.
+
+    Args:
+        src_folder (str): The source folder.
+        dest_folder (str or list): The destination folder, or every destination it could be placed on.
+        classify (callable): The folder name classifier. Defaults to get_folder_filter().
+
+    Returns:
+        list: (folder name, reason) tuples, sorted by name; the reason is None for folders to move.
+    """
+    classify = classify or get_folder_filter()
+    dest_folders = [dest_folder] if isinstance(dest_folder, str) else dest_folder
+    decisions = []
+    for folder_name in sorted(os.listdir(src_folder)):
+        folder_path = os.path.join(src_folder, folder_name)
+        dest_paths = [os.path.join(folder, folder_name) for folder in dest_folders]
+
+        if not os.path.isdir(folder_path):
+            reason = "not a folder"
+        elif not os.listdir(folder_path):
+            reason = "empty folder"
+        # A folder already at the destination is skipped, unless an earlier run copied it and was
+        # interrupted before deleting the source
+        elif any(os.path.exists(dest_path) and not read_checkpoints(dest_path + partial_suffix + journal_suffix)[1]
+                 for dest_path in dest_paths):
+            reason = "already at the destination"
+        else:
+            reason = classify(folder_name)
+        decisions.append((folder_name, reason))
+    return decisions
+
+def plan_transfers(src_folder, dest_folder, log_text, decisions=None):
+    """
+    Lists the folders of the source folder that should be moved to the destination folder.
+
+    A folder is moved if it isn't empty, doesn't exist at the destination yet (or an earlier run was
+    interrupted before finishing it), has no release keywords or file extensions in its name and is named
+    like "Title (Year)".
+
+    Args:
+        src_folder (str): The source folder.
+        dest_folder (str): The destination folder.
+        log_text (tkinter.Text): The log box.
+        decisions (list): The result of classify_folders(), if already known.
+
+    Returns:
+        list: One dict per folder with its name, source path, dest path, size in bytes and destination share.
+    """
+    jobs = []
+    for folder_name, reason in decisions or classify_folders(src_folder, dest_folder):
+        folder_path = os.path.join(src_folder, folder_name)
+        dest_path = os.path.join(dest_folder, folder_name)
+
+        if reason == "empty folder":
+            log_message(log_text, f"Skipping empty folder {folder_name}")
+        if reason:
+            continue
+
+        jobs.append({
+            'name': folder_name,
+            'source': folder_path,
+            'dest': dest_path,
+            'size': folder_size(folder_path),
+            'share': destination_share(dest_path),
+        })
+    return jobs
+
+def cached_disk_usage(path):
+    """
+    Returns shutil.disk_usage(path), cached per share for free_space_ttl seconds.
+    """
+    share = destination_share(path)
+    with disk_usage_lock:
+        cached = disk_usage_cache.get(share)
+        if cached and time.monotonic() - cached[0] < free_space_ttl:
+            return cached[1]
+    usage = shutil.disk_usage(path)
+    with disk_usage_lock:
+        disk_usage_cache[share] = (time.monotonic(), usage)
+    return usage
+
+def placement_candidates(dest_folder, dest_options):
+    """
+    Returns the destinations a folder picked for dest_folder may be placed on: the existing options of the
+    same category (the same last path component, e.g. "HD Movies"), starting with dest_folder itself.
+    """
+    category = os.path.basename(os.path.normpath(dest_folder)).lower()
+    candidates = [dest_folder]
+    for option in dest_options:
+        if option not in candidates and os.path.basename(os.path.normpath(option)).lower() == category and os.path.isdir(option):
+            candidates.append(option)
+    return candidates
+
+def earlier_destination(folder_name, dest_folders):
+    """
+    Returns the destination an earlier, interrupted run was moving a folder to, or None.
+    """
+    for dest_folder in dest_folders:
+        partial_path = os.path.join(dest_folder, folder_name) + partial_suffix
+        if os.path.exists(partial_path) or os.path.exists(partial_path + journal_suffix):
+            return dest_folder
+    return None
+
+def place_transfers(jobs, dest_folders, log_text, reserve=0):
+    """
+    Spreads transfer jobs across destinations so the drives fill evenly and none runs out of space mid-copy.
+
+    The largest folders are placed first, each on the destination that has room for it (keeping reserve
+    bytes free) and will be the least full afterwards. A folder on the same filesystem as a destination is
+    renamed there, so it needs no room on it. A folder an earlier run was already moving stays on that
+    destination.
+
+    Args:
+        jobs (list): Jobs from plan_transfers(); their dest and share are updated.
+        dest_folders (list): The destinations to choose from.
+        log_text (tkinter.Text): The log box, for unreachable destinations.
+        reserve (int): Bytes to keep free on every destination.
+
+    Returns:
+        tuple: (placed jobs, jobs that fit nowhere, summary lines describing the placement).
+    """
+    usage = {}
+    for dest_folder in dest_folders:
+        try:
+            usage[dest_folder] = cached_disk_usage(dest_folder)
+        except OSError as e:
+            log_message(log_text, f"Can't read the free space of {dest_folder}: {e}")
+    candidates = [dest_folder for dest_folder in dest_folders if dest_folder in usage]
+
+    assigned = {}
+    placement = {dest_folder: [] for dest_folder in candidates}
+    needed = {}
+    placed, unplaced = [], []
+    for job in sorted(jobs, key=lambda job: job['size'], reverse=True):
+        earlier = earlier_destination(job['name'], candidates)
+        best, best_fill, best_size = None, None, None
+        for dest_folder in [earlier] if earlier else candidates:
+            dest_usage = usage[dest_folder]
+            share = destination_share(os.path.join(dest_folder, job['name']))
+            size = 0 if same_device(job['source'], dest_folder) else job['size']
+            if size and size > dest_usage.free - assigned.get(share, 0) - reserve:
+                continue
+            fill = (dest_usage.total - dest_usage.free + assigned.get(share, 0) + size) / dest_usage.total
+            if best is None or fill < best_fill:
+                best, best_fill, best_size = dest_folder, fill, size
+        if best is None:
+            unplaced.append(job)
+            continue
+
+        job['dest'] = os.path.join(best, job['name'])
+        job['share'] = destination_share(job['dest'])
+        assigned[job['share']] = assigned.get(job['share'], 0) + best_size
+        needed[job['name']] = best_size
+        placement[best].append(job)
+        placed.append(job)
+
+    summary = []
+    for dest_folder in candidates:
+        dest_usage = usage[dest_folder]
+        size = sum(needed[job['name']] for job in placement[dest_folder])
+        summary.append(f"{dest_folder}: {len(placement[dest_folder])} folders, {size / 1024 ** 3:.1f} GB, "
+                       f"{dest_usage.free / 1024 ** 4:.2f} TB free, {(dest_usage.total - dest_usage.free + size) / dest_usage.total * 100:.0f}% full after")
+        for job in placement[dest_folder]:
+            same_disk = ", same filesystem" if not needed[job['name']] else ""
+            summary.append(f"    {job['name']} ({job['size'] / 1024 ** 3:.1f} GB{same_disk})")
+    for job in unplaced:
+        summary.append(f"No room for {job['name']} ({job['size'] / 1024 ** 3:.1f} GB)")
+
+    order = {job['name']: index for index, job in enumerate(jobs)}
+    placed.sort(key=lambda job: order[job['name']])
+    return placed, unplaced, summary
+
+def plan_placed_transfers(src_folder, dest_folders, log_text, reserve=0):
+    """
+    Classifies the folders of the source folder, sizes the ones to move and places them on the destinations,
+    keeping reserve bytes free on each (see place_transfers()).
+
+    Returns:
+        tuple: (decisions from classify_folders(), placed jobs, jobs that fit nowhere, placement summary).
+    """
+    decisions = classify_folders(src_folder, dest_folders)
+    jobs = plan_transfers(src_folder, dest_folders[0], log_text, decisions)
+    placed, unplaced, summary = place_transfers(jobs, dest_folders, log_text, reserve)
+    return decisions, placed, unplaced, summary
+
+def format_plan(src_folder, dest_folder, dest_options=None):
+    """
+    Describes what a transfer would do, without moving anything.
+
+    Args:
+        src_folder (str): The source folder.
+        dest_folder (str): The destination folder.
+        dest_options (list): With auto-placement, the destinations to spread the folders across.
+
+    Returns:
+        list: One line per entry of the source folder: MOVE with the folder size and destination, or SKIP
+        with the reason, followed by the placement summary.
+    """
+    dest_folders = placement_candidates(dest_folder, dest_options) if dest_options else [dest_folder]
+    reserve = placement_reserve_bytes if dest_options else 0
+    decisions, placed, unplaced, summary = plan_placed_transfers(src_folder, dest_folders, None, reserve)
+    jobs = {job['name']: job for job in placed}
+    unplaced_names = {job['name'] for job in unplaced}
+    lines = []
+    for folder_name, reason in decisions:
+        if folder_name in unplaced_names:
+            reason = "not enough free space"
+        if reason:
+            lines.append(f"SKIP  {folder_name}: {reason}")
+        else:
+            job = jobs[folder_name]
+            lines.append(f"MOVE  {folder_name} ({job['size'] / 1024 ** 3:.1f} GB) -> {os.path.dirname(job['dest'])}")
+    lines.append(f"{len(placed)} of {len(decisions)} folders would be moved, "
+                 f"{sum(job['size'] for job in placed) / 1024 ** 3:.1f} GB")
+    return lines + summary
+
+def show_plan(src_combo, dest_combo, log_text, dest_options=None):
+    """
+    Lists in the log box what Execute would move and why the other folders are skipped, on a worker thread.
+    """
+    def run():
+        src_folder = src_combo.get()
+        dest_folder = dest_combo.get()
+        if not os.path.exists(src_folder) or not os.path.exists(dest_folder):
+            log_message(log_text, "Pick an existing source and destination first")
+            return
+        log_message(log_text, f"Plan for {src_folder} -> {dest_folder}:")
+        for line in format_plan(src_folder, dest_folder, dest_options):
+            log_message(log_text, line)
+
+    threading.Thread(target=run).start()
+
+def new_hasher():
+    """
+    Returns a new hash object for checksum_algorithm.
+    """
+    return xxhash.xxh3_128() if xxhash else hashlib.blake2b()
 
+def hash_file(path, written=None):
+    """
+    Hashes a file.
+
+    Args:
+        path (str): The file to hash.
+        written (dict): For a file that is still being copied: {'bytes', 'done', 'failed', 'condition'},
+            updated by the copy. Reading stays behind 'bytes' until 'done' is set, so the hash trails the
+            copy and reads the data while it is still in the OS cache.
+
+    Returns:
+        str: The hex digest, or None if the copy failed.
+    """
+    hasher = new_hasher()
+    buf = bytearray(copy_buffer_size)
+    view = memoryview(buf)
+    position = 0
+    with open(path, 'rb') as file:
         while True:
-            buf = fsrc.read(chunk_size)
-            if not buf:
+            limit = len(buf)
+            done = True
+            if written is not None:
+                with written['condition']:
+                    while written['bytes'] <= position and not written['done']:
+                        written['condition'].wait()
+                    if written['failed']:
+                        return None
+                    done = written['done']
+                    if not done:
+                        limit = min(limit, written['bytes'] - position)
+            count = file.readinto(view[:limit])
+            if count:
+                hasher.update(view[:count])
+                position += count
+            elif done:
                 break
-            fdest.write(buf)
-            
-            copied_size += len(buf)
-            progress_value = (copied_size / total_size) * max_value
-            progress_bar["value"] = progress_value
+            else:
+                # The last bytes are still buffered by the writer; they are on disk once the copy is done
+                with written['condition']:
+                    while not written['done']:
+                        written['condition'].wait()
+    return hasher.hexdigest()
+
+def copy_file_verified(src, dest, progress=None, offset=0, checkpoint=None):
+    """
+    Copies a file with copy_file() while two threads hash the source and the written destination,
+    each trailing just behind the copy, so verifying adds little to the copy time.
+
+    Args:
+        src (str): The path of the source file.
+        dest (str): The path of the destination file.
+        progress (callable): See copy_file().
+        offset (int): See copy_file(); the bytes already in dest are verified too.
+        checkpoint (callable): See copy_file().
+
+    Returns:
+        tuple: The hex digests of the source and of the destination.
+    """
+    written = {'bytes': offset, 'done': False, 'failed': False, 'condition': threading.Condition()}
+
+    def copy_progress(copied_size, total_size):
+        with written['condition']:
+            written['bytes'] = copied_size
+            written['condition'].notify_all()
+        if progress:
+            progress(copied_size, total_size)
+
+    if not offset:
+        # The destination hash opens the file before the copy does
+        open(dest, 'wb').close()
 
-            percentage = (copied_size / total_size) * 100
-            progress_label.config(text=f"{percentage:.1f}%")
-            progress_label.update()
+    with ThreadPoolExecutor(max_workers=2) as hashers:
+        src_hash = hashers.submit(hash_file, src, written)
+        dest_hash = hashers.submit(hash_file, dest, written)
+        try:
+            copy_file(src, dest, copy_progress, offset=offset, checkpoint=checkpoint)
+        except BaseException:
+            written['failed'] = True
+            raise
+        finally:
+            with written['condition']:
+                written['done'] = True
+                written['condition'].notify_all()
 
-            current_file_label.config(text=f"Copying: {os.path.basename(src)}")
-            current_file_label.update()
+    return src_hash.result(), dest_hash.result()
 
-            # Add print statements for debugging
-            print(f"Copying {os.path.basename(src)}")
-            print(f"Progress: {percentage:.1f}%")
-            print(f"Progress value: {progress_value}")
+def verify_copied_file(src, dest):
+    """
+    Hashes a source file and its copy in parallel and returns the digest; raises OSError if they differ.
+    """
+    with ThreadPoolExecutor(max_workers=2) as hashers:
+        src_hash = hashers.submit(hash_file, src)
+        dest_hash = hashers.submit(hash_file, dest)
+    if src_hash.result() != dest_hash.result():
+        raise OSError(f"Checksum mismatch between {src} and {dest}")
+    return src_hash.result()
+
+def write_checksum_manifest(folder_path, digests):
+    """
+    Writes the sidecar checksum file of a folder, one "<hash>  <file path>" line per file, with the paths
+    relative to the folder and '/' separated.
+    """
+    manifest_path = os.path.join(folder_path, checksum_manifest_name)
+    with open(manifest_path, 'w', encoding='utf-8') as manifest:
+        for filename in sorted(digests):
+            manifest.write(f"{digests[filename]}  {filename.replace(os.sep, '/')}\n")
+        manifest.flush()
+        os.fsync(manifest.fileno())
+
+def append_checkpoint(journal_path, record):
+    """
+    Appends a record to a transfer journal and flushes it to disk before returning.
+
+    Args:
+        journal_path (str): The path of the journal.
+        record (dict): A file checkpoint {'file', 'size', 'mtime_ns', 'offset'} or {'complete': True}.
 
-def execute_transfer(src_combo, dest_combo, progress_bar, progress_label, log_text, current_file_label):
+    Returns:
+        None
+    """
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        journal.write(json.dumps(record) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+
+def read_checkpoints(journal_path):
+    """
+    Reads a transfer journal.
+
+    Args:
+        journal_path (str): The path of the journal.
+
+    Returns:
+        tuple: (checkpoints, complete) where checkpoints maps each file name to its latest checkpoint and
+        complete is True once every file was copied. A missing journal, or a torn last line, is tolerated.
     """
-    Executes a transfer of files from the source folder to the destination folder.
+    checkpoints = {}
+    complete = False
+    try:
+        with open(journal_path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('complete'):
+                    complete = True
+                elif 'file' in record:
+                    checkpoints[record['file']] = record
+    except FileNotFoundError:
+        pass
+    return checkpoints, complete
+
+def copy_file_resumable(src_file_path, partial_path, filename, checkpoints, journal_path, account, log_text,
+                        verify=False):
+    """
+    Copies one file into a partial folder as "<name>.part", resuming from its last checkpoint when the
+    source file hasn't changed since, and renames it to its real name once complete. The filename is the
+    path of the file relative to the folder, so files of subfolders are checkpointed by their own path.
+
+    With verify, the copy is checked against the source (see copy_file_verified()) and its digest is
+    returned; a file that doesn't match is deleted and its checkpoint reset before the error is raised.
+    """
+    stat = os.stat(src_file_path)
+    dest_file_path = os.path.join(partial_path, filename)
+    part_path = dest_file_path + ".part"
+    record = {'file': filename, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'offset': 0}
+
+    offset = 0
+    checkpoint = checkpoints.get(filename)
+    if checkpoint and checkpoint['size'] == stat.st_size and checkpoint['mtime_ns'] == stat.st_mtime_ns:
+        if checkpoint['offset'] == stat.st_size and os.path.exists(dest_file_path):
+            log_message(log_text, f"Already copied {filename}")
+            account(stat.st_size, False)
+            if verify and checkpoint.get('algorithm') != checksum_algorithm:
+                return verify_copied_file(src_file_path, dest_file_path)
+            return checkpoint.get('hash')
+        if os.path.exists(part_path) and os.path.getsize(part_path) >= checkpoint['offset']:
+            offset = checkpoint['offset']
+
+    if offset:
+        log_message(log_text, f"Resuming {filename} at {offset / (1024 * 1024):.0f} MB")
+        account(offset, False)
+    else:
+        log_message(log_text, f"Starting to copy {filename}")
+
+    file_copied = [offset]
+
+    def file_progress(copied_size, total_size):
+        account(copied_size - file_copied[0], True)
+        file_copied[0] = copied_size
+
+    def save_checkpoint(copied_size):
+        append_checkpoint(journal_path, dict(record, offset=copied_size))
+
+    if not verify:
+        copied_size = copy_file(src_file_path, part_path, file_progress, offset=offset, checkpoint=save_checkpoint)
+        if copied_size != stat.st_size:
+            raise OSError(f"{filename} changed while it was being copied, it will be copied again on the next run")
+        os.replace(part_path, dest_file_path)
+        save_checkpoint(stat.st_size)
+        return None
+
+    digest, dest_digest = copy_file_verified(src_file_path, part_path, file_progress, offset=offset,
+                                             checkpoint=save_checkpoint)
+    if digest != dest_digest:
+        os.remove(part_path)
+        save_checkpoint(0)
+        raise OSError(f"Checksum mismatch after copying {filename}, it will be copied again on the next run")
+    log_message(log_text, f"Verified {filename}")
+    os.replace(part_path, dest_file_path)
+    append_checkpoint(journal_path, dict(record, offset=stat.st_size, hash=digest, algorithm=checksum_algorithm))
+    return digest
+
+def transfer_folder(job, account, log_text, verify=False):
+    """
+    Moves one folder: renamed into place when the destination is on the same filesystem, otherwise copied
+    and then deleted.
+
+    A copy goes to "<name>.partial" first, subfolders included, with every file checkpointed by its relative
+    path in "<name>.partial.journal", so an interrupted copy resumes where it stopped on the next run. Only
+    once every file is there is the folder renamed to its real name and the source deleted. With verify,
+    every file is also checked against the source and the hashes are written to the folder's sidecar
+    checksum file first.
+
+    Args:
+        job (dict): A job from plan_transfers().
+        account (callable): Called with (byte_count, copied) as data is moved; copied is False for renames
+            and for data copied by an earlier run.
+        log_text (tkinter.Text): The log box.
+        verify (bool): Verify the copied files before deleting the source.
+
+    Returns:
+        None
+    """
+    folder_name, folder_path, dest_path = job['name'], job['source'], job['dest']
+    partial_path = dest_path + partial_suffix
+    journal_path = partial_path + journal_suffix
+    checkpoints, complete = read_checkpoints(journal_path)
+
+    if not complete and not os.path.exists(partial_path):
+        if same_device(folder_path, os.path.dirname(dest_path)) and move_by_rename(folder_path, dest_path):
+            log_message(log_text, f"Moved {folder_name} instantly (same filesystem)")
+            account(job['size'], False)
+            return
+
+    if not complete:
+        os.makedirs(partial_path, exist_ok=True)
+        digests = {}
+        for root, dirnames, filenames in os.walk(folder_path):
+            relative_root = os.path.relpath(root, folder_path)
+            for dirname in dirnames:
+                os.makedirs(os.path.join(partial_path, relative_root, dirname), exist_ok=True)
+            for filename in filenames:
+                relative_path = os.path.normpath(os.path.join(relative_root, filename))
+                digests[relative_path] = copy_file_resumable(os.path.join(root, filename), partial_path, relative_path,
+                                                             checkpoints, journal_path, account, log_text, verify)
+        if verify:
+            write_checksum_manifest(partial_path, digests)
+        append_checkpoint(journal_path, {'complete': True})
+    else:
+        log_message(log_text, f"Finishing the earlier move of {folder_name}")
+        account(job['size'], False)
+
+    if os.path.exists(partial_path):
+        os.rename(partial_path, dest_path)
+
+    log_message(log_text, f"Move complete, now deleting original folder {folder_name}")
+    shutil.rmtree(folder_path)
+    os.remove(journal_path)
+
+def run_transfers(jobs, log_text, progress=None, max_concurrent=None, per_destination=None,
+                  bandwidth_limits=None, smallest_first=None, verify=None):
+    """
+    Runs transfer jobs concurrently.
+
+    Up to max_concurrent folders are moved at once, with at most per_destination of them going to the same
+    share. A job whose share is busy doesn't hold up jobs for other shares. Shares listed in bandwidth_limits
+    are capped at that many bytes per second, shared by all the jobs writing to them.
+
+    Args:
+        jobs (list): Jobs from plan_transfers().
+        log_text (tkinter.Text): The log box.
+        progress (callable): Called with a stats dict (bytes, copied, total, done, jobs, active, start) as data
+            is moved, from worker threads; wrap it with throttle() for GUI updates.
+        max_concurrent (int): Folders moved at once. Defaults to max_concurrent_transfers.
+        per_destination (int): Folders moved at once to one share. Defaults to per_destination_transfers.
+        bandwidth_limits (dict): Share -> bytes per second. Defaults to destination_bandwidth_limits.
+        smallest_first (bool): Start with the smallest folders. Defaults to transfer_smallest_first.
+        verify (bool): Verify copies before deleting the sources. Defaults to verify_copies.
+
+    Returns:
+        dict: The final stats.
+    """
+    max_concurrent = max_concurrent or max_concurrent_transfers
+    per_destination = per_destination or per_destination_transfers
+    if bandwidth_limits is None:
+        bandwidth_limits = destination_bandwidth_limits
+    if smallest_first is None:
+        smallest_first = transfer_smallest_first
+    if verify is None:
+        verify = verify_copies
+
+    pending = sorted(jobs, key=lambda job: job['size']) if smallest_first else list(jobs)
+    limiters = {share: make_rate_limiter(limit) for share, limit in bandwidth_limits.items() if limit}
+    active = {}
+    condition = threading.Condition()
+    stats = {'bytes': 0, 'copied': 0, 'total': sum(job['size'] for job in jobs), 'done': 0,
+             'jobs': len(jobs), 'active': 0, 'start': time.monotonic()}
+
+    def run(job):
+        limiter = limiters.get(job['share'])
+
+        def account(byte_count, copied):
+            if limiter and copied:
+                limiter(byte_count)
+            with condition:
+                stats['bytes'] += byte_count
+                if copied:
+                    stats['copied'] += byte_count
+            if progress:
+                progress(stats)
+
+        try:
+            transfer_folder(job, account, log_text, verify)
+        except Exception as e:
+            log_message(log_text, f"Error moving {job['name']}: {str(e)}")
+        finally:
+            with condition:
+                active[job['share']] -= 1
+                stats['active'] -= 1
+                stats['done'] += 1
+                condition.notify()
+            if progress:
+                progress(stats)
+
+    with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+        with condition:
+            while pending:
+                job = None
+                if stats['active'] < max_concurrent:
+                    job = next((job for job in pending if active.get(job['share'], 0) < per_destination), None)
+                if job is None:
+                    condition.wait()
+                    continue
+                pending.remove(job)
+                active[job['share']] = active.get(job['share'], 0) + 1
+                stats['active'] += 1
+                executor.submit(run, job)
+
+    return stats
+
+def execute_transfer(src_combo, dest_combo, progress_bar, progress_label, log_text, current_file_label,
+                     max_concurrent=None, smallest_first=None, verify=None, dest_options=None):
+    """
+    Executes a transfer of folders from the source folder to the destination folder.
 
     Parameters:
     - src_combo (tkinter.ComboBox): The ComboBox widget containing the source folder path.
@@ -105,7 +992,11 @@ def execute_transfer(src_combo, dest_combo, progress_bar, progress_label, log_te
     - progress_bar (tkinter.ProgressBar): The ProgressBar widget representing the progress of the transfer.
     - progress_label (tkinter.Label): The Label widget displaying the progress of the transfer.
     - log_text (tkinter.Text): The Text widget displaying the log of the transfer.
-    - current_file_label (tkinter.Label): The Label widget displaying the name of the current file being transferred.
+    - current_file_label (tkinter.Label): The Label widget displaying the transfer status.
+    - max_concurrent (int): Folders moved at once. Defaults to max_concurrent_transfers.
+    - smallest_first (bool): Start with the smallest folders. Defaults to transfer_smallest_first.
+    - verify (bool): Verify copies before deleting the sources. Defaults to verify_copies.
+    - dest_options (list): When given, folders are auto-placed across the options of the destination's category.
 
     Returns:
     - None
@@ -113,16 +1004,11 @@ def execute_transfer(src_combo, dest_combo, progress_bar, progress_label, log_te
     Description:
     - Retrieves the source and destination folder paths from the ComboBox widgets.
     - Checks if the source and destination folders exist. If not, returns immediately.
-    - Iterates over each folder in the source folder.
-    - For each folder, checks if it is empty. If so, skips it and logs the skip.
-    - Checks if the destination path already exists or if the folder path is not a directory. If so, continues to the next folder.
-    - Checks if the folder name matches any of the specified patterns. If so, continues to the next folder.
-    - Checks if the folder name matches the pattern for a folder with a year suffix. If so, creates the destination path.
-    - For each file in the folder, copies it to the destination folder with progress tracking.
-    - Logs the start of the copy and updates the progress bar and label.
-    - Logs the completion of the copy and updates the progress bar and label.
-    - Deletes the original folder.
-    - Logs any errors that occur during the transfer.
+    - Plans the folders to move and places them where there is room, spread across the drives of the
+      destination's category with auto-placement, and logs the placement.
+    - Moves them concurrently with run_transfers(), per share limits applied.
+    - Verifies the copies against the sources before deleting them, unless verify is off.
+    - Shows the overall progress and the aggregate throughput while the folders are moved.
     """
     src_folder = src_combo.get()
     dest_folder = dest_combo.get()
@@ -130,51 +1016,42 @@ def execute_transfer(src_combo, dest_combo, progress_bar, progress_label, log_te
     if not os.path.exists(src_folder) or not os.path.exists(dest_folder):
         return
 
-    for folder_name in os.listdir(src_folder):
-        folder_path = os.path.join(src_folder, folder_name)
-        dest_path = os.path.join(dest_folder, folder_name)
-
-        # Check if folder is empty
-        if not os.listdir(folder_path):
-            print(f"Skipping empty folder {folder_name}")
-            log_text.insert(tk.END, f"Skipping empty folder {folder_name}\n")
-            log_text.yview(tk.END)
-            continue
-
-        if os.path.exists(dest_path) or not os.path.isdir(folder_path):
-            continue
+    dest_folders = placement_candidates(dest_folder, dest_options) if dest_options else [dest_folder]
+    reserve = placement_reserve_bytes if dest_options else 0
+    decisions, jobs, unplaced, summary = plan_placed_transfers(src_folder, dest_folders, log_text, reserve)
+    for line in summary:
+        log_message(log_text, line)
+    if not jobs:
+        log_message(log_text, "Nothing to move")
+        return
 
-        if re.search(r"(mkv|dolby|bluray|dvdrip|remux|avc|truehd|atmos|dts|fgt|hdtv|remastered|dvd|rarbg|1080p|720p|480p|360p|1440p|2k|4k|mov|mkv|m4k|mp4|avi|mpg|mpeg|m4v|wmv|ts|m2ts|flv|divx|heiv)", folder_name, re.I):
-            continue
+    total_size = sum(job['size'] for job in jobs)
+    log_message(log_text, f"Moving {len(jobs)} folders ({total_size / 1024 ** 3:.1f} GB)")
 
-        if re.match(r".+ \(\d{4}\)$", folder_name):
-            try:
-                os.makedirs(dest_path, exist_ok=True)
-                
-                for filename in os.listdir(folder_path):
-                    src_file_path = os.path.join(folder_path, filename)
-                    dest_file_path = os.path.join(dest_path, filename)
+    def update_widgets(stats):
+        fraction = stats['bytes'] / total_size if total_size else 1
+        elapsed = time.monotonic() - stats['start']
+        rate = stats['copied'] / (1024 * 1024) / elapsed if elapsed else 0
+        progress_bar["value"] = fraction * 100
+        progress_label.config(text=f"{fraction * 100:.1f}%")
+        current_file_label.config(text=f"Moving {stats['active']} folders, {stats['done']}/{len(jobs)} done, {rate:.0f} MB/s")
 
-                    print(f"Starting to copy {filename}")
-                    log_text.insert(tk.END, f"Starting to copy {filename}\n")
-                    log_text.yview(tk.END)
+    show_progress = throttle(lambda done, job_count, stats: progress_bar.after(0, update_widgets, stats))
 
-                    copy_with_progress(src_file_path, dest_file_path, progress_bar, progress_label, 100, current_file_label)
+    def progress(stats):
+        show_progress(stats['done'], stats['jobs'], dict(stats))
 
-                print(f"Move complete, now deleting original folder {folder_name}")
-                log_text.insert(tk.END, f"Move complete, now deleting original folder {folder_name}\n")
-                log_text.yview(tk.END)
-
-                shutil.rmtree(folder_path)
-            except Exception as e:
-                print(f"Error moving {folder_name}: {str(e)}")
-                log_text.insert(tk.END, f"Error moving {folder_name}: {str(e)}\n")
-                log_text.yview(tk.END)
+    stats = run_transfers(jobs, log_text, progress, max_concurrent=max_concurrent, smallest_first=smallest_first,
+                          verify=verify)
+    elapsed = time.monotonic() - stats['start']
+    log_message(log_text, f"Transfer finished: {stats['done']} folders, "
+                          f"{stats['copied'] / (1024 * 1024) / elapsed if elapsed else 0:.0f} MB/s copied")
 
 
 import threading
 
-def execute_in_thread(src_combo, dest_combo, progress_bar, progress_label, log_text, current_file_label):
+def execute_in_thread(src_combo, dest_combo, progress_bar, progress_label, log_text, current_file_label,
+                      max_concurrent=None, smallest_first=None, verify=None, dest_options=None):
     """
     Executes the given function in a separate thread.
 
@@ -184,87 +1061,253 @@ def execute_in_thread(src_combo, dest_combo, progress_bar, progress_label, log_t
     :param progress_label: The progress label.
     :param log_text: The log text.
     :param current_file_label: The current file label.
+    :param max_concurrent: Folders moved at once.
+    :param smallest_first: Start with the smallest folders.
+    :param verify: Verify copies before deleting the sources.
+    :param dest_options: The destinations to auto-place folders across, or None to use the chosen one.
 
     :return: None
     """
     print("Starting execution in thread")
-    t = threading.Thread(target=execute_transfer, args=(src_combo, dest_combo, progress_bar, progress_label, log_text, current_file_label))
+    t = threading.Thread(target=execute_transfer, args=(src_combo, dest_combo, progress_bar, progress_label, log_text, current_file_label,
+                                                        max_concurrent, smallest_first, verify, dest_options))
     t.start()
     print("Execution in thread started")
 
-import subprocess
-import tkinter as tk
+rename_engine = None
 
-import os
-import subprocess
+def load_rename_engine():
+    """
+    Imports "Rename Existing Folders.py" from this script's folder (its name isn't a valid module name).
+    """
+    global rename_engine
+    if rename_engine is None:
+        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Rename Existing Folders.py")
+        spec = importlib.util.spec_from_file_location("rename_existing_folders", script_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        rename_engine = module
+    return rename_engine
 
-def execute_rename_script(log_text):
+def execute_rename(src_combo, log_text):
     """
-    Executes a rename script.
+    Renames the folders of the chosen source folder to "Title (Year)" with Rename Existing Folders, on a
+    worker thread, and logs what was renamed.
 
     Parameters:
+        src_combo (Combobox): The combo box with the source folder.
         log_text (Text): The text widget used to display the log output.
 
     Returns:
         None
     """
-    script_path = os.path.join("C:", "Users", "bax11", "OneDrive", "Desktop", "Script_Tasks", "Main", "Rename Existing Folders.py")
-    process = subprocess.Popen(["python", script_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-    while True:
-        output = process.stdout.readline()
-        if output == '' and process.poll() is not None:
-            break
-        if output:
-            print(output)  # Added print statement for debugging
-            log_text.insert(tk.END, output)
-            log_text.yview(tk.END)
-
-root = tk.Tk()
-root.title("Movie Transfer Utility")
-
-frame = ttk.Frame(root, padding="10")
-frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-
-src_options = ["C:\\Holds", "C:\\Users\\bax11\\AppData\\Roaming\\Kodi\\userdata\\addon_data\\plugin.video.ezra\\Movies Downloads"]
-src_combo = ttk.Combobox(frame, values=src_options, width=47)
-src_combo.grid(row=0, column=0, sticky=tk.W)
-src_combo.current(0)
-src_button = ttk.Button(frame, text="Browse", command=lambda: browse_folder(src_combo))
-src_button.grid(row=0, column=1)
-
-dest_options = [
-    "\\\\192.168.1.145\\e\\HD Movies", "\\\\192.168.1.145\\f\\HD Movies", "\\\\192.168.1.145\\j\\HD Movies",
-    "\\\\192.168.1.145\\k\\HD Movies", "\\\\192.168.1.145\\l\\HD Movies", "\\\\192.168.1.145\\m\\HD Movies",
-    "\\\\192.168.1.145\\n\\HD Movies", "\\\\192.168.1.145\\e\\Adult", "\\\\192.168.1.145\\f\\Adult",
-    "\\\\192.168.1.145\\j\\Adult", "\\\\192.168.1.145\\k\\Adult", "\\\\192.168.1.145\\l\\Adult",
-    "\\\\192.168.1.145\\m\\Adult", "\\\\192.168.1.145\\n\\Adult"
-]
-dest_combo = ttk.Combobox(frame, values=dest_options, width=47)
-dest_combo.grid(row=1, column=0, sticky=tk.W)
-dest_combo.current(6)
-dest_button = ttk.Button(frame, text="Browse", command=lambda: browse_folder(dest_combo))
-dest_button.grid(row=1, column=1)
-
-execute_button = ttk.Button(frame, text="Execute", command=lambda: execute_in_thread(src_combo, dest_combo, progress_bar, progress_label, log_text, current_file_label))
-execute_button.grid(row=2, column=0)
-
-rename_button = ttk.Button(frame, text="Rename", command=lambda: execute_rename_script(log_text))
-rename_button.grid(row=2, column=1)
-
-progress_bar = ttk.Progressbar(frame, orient="horizontal", length=200, mode="determinate")
-progress_bar.grid(row=3, column=0, columnspan=2)
-
-progress_label = tk.Label(frame, text="0.0%")
-progress_label.grid(row=3, column=2)
-
-log_text = tk.Text(frame, height=10, width=80, bg="black", fg="lime green", font=("Arial", 12, "bold"))
-log_text.grid(row=4, columnspan=3)
-
-current_file_label = tk.Label(frame, text="Current File: ")
-current_file_label.grid(row=5, columnspan=3)
-
-root.mainloop()
+    directory_path = src_combo.get()
+
+    def run():
+        if not os.path.isdir(directory_path):
+            log_message(log_text, f"Can't rename folders, {directory_path} doesn't exist")
+            return
+        try:
+            results = load_rename_engine().rename_folders(directory_path)
+        except Exception as e:
+            log_message(log_text, f"Error renaming folders in {directory_path}: {str(e)}")
+            return
+
+        counts = {}
+        for status, old_name, new_name in results:
+            counts[status] = counts.get(status, 0) + 1
+            if status == 'rename':
+                log_message(log_text, f"Renamed: {old_name} -> {new_name}")
+            elif status == 'file_open':
+                log_message(log_text, f"Skipped {old_name}: a movie file is still being written")
+            elif status == 'permission_error':
+                log_message(log_text, f"Skipped {old_name}: permission denied")
+        log_message(log_text, f"Total folders renamed: {counts.get('rename', 0)}, "
+                              f"skipped: {len(results) - counts.get('rename', 0)}")
+
+    threading.Thread(target=run).start()
+
+def legacy_copy(src, dest):
+    """
+    The original copy loop (1 MiB read/write chunks), kept for the benchmark.
+    """
+    with open(src, 'rb') as fsrc, open(dest, 'wb') as fdest:
+        while True:
+            buf = fsrc.read(1024 * 1024)
+            if not buf:
+                break
+            fdest.write(buf)
+
+def benchmark_copy(size_gb=2, folder=None):
+    """
+    Compares the MB/s of the original copy loop with copy_file(), with and without verification, on a sparse
+    file and on a generated file.
+
+    Args:
+        size_gb (float): The size of the test files in GB.
+        folder (str): Where to create the test files, e.g. a network share. Defaults to a temporary folder.
+
+    Returns:
+        None
+    """
+    size = int(size_gb * 1024 ** 3)
+    with tempfile.TemporaryDirectory(dir=folder) as work_folder:
+        sparse_path = os.path.join(work_folder, 'sparse.bin')
+        with open(sparse_path, 'wb') as file:
+            file.truncate(size)
+
+        generated_path = os.path.join(work_folder, 'generated.bin')
+        block = os.urandom(copy_buffer_size)
+        with open(generated_path, 'wb') as file:
+            for _ in range(size // len(block)):
+                file.write(block)
+            file.write(block[:size % len(block)])
+
+        for label, path in (("Sparse", sparse_path), ("Generated", generated_path)):
+            for method, copy in (("1 MiB read/write loop", legacy_copy),
+                                 ("copy_file", lambda src, dest: copy_file(src, dest, throttle(lambda copied, total: None))),
+                                 (f"copy_file + {checksum_algorithm} verify", copy_file_verified)):
+                dest = os.path.join(work_folder, 'copy.bin')
+                start_time = time.perf_counter()
+                copy(path, dest)
+                elapsed = time.perf_counter() - start_time
+                ok = os.path.getsize(dest) == size
+                os.remove(dest)
+                print(f"{label} {size_gb} GB, {method}: {size / (1024 * 1024) / elapsed:.0f} MB/s"
+                      f"{'' if ok else ' (SIZE MISMATCH)'}")
+
+def legacy_classify(folder_name):
+    """
+    The original folder name test (True if the folder would be moved), kept for the benchmark.
+    """
+    if re.search(r"(mkv|dolby|bluray|dvdrip|remux|avc|truehd|atmos|dts|fgt|hdtv|remastered|dvd|rarbg|1080p|720p|480p|360p|1440p|2k|4k|mov|mkv|m4k|mp4|avi|mpg|mpeg|m4v|wmv|ts|m2ts|flv|divx|heiv)", folder_name, re.I):
+        return False
+    return bool(re.match(r".+ \(\d{4}\)$", folder_name))
+
+def benchmark_classifier(count=1000000):
+    """
+    Times the original folder name test and the compiled classifier on synthetic folder names, and counts
+    the names they disagree on (mostly short keywords matched inside words, e.g. "ts" in "Avengers").
+
+    Args:
+        count (int): The number of names to classify.
+
+    Returns:
+        None
+    """
+    rng = random.Random(0)
+    words = ["The", "Avengers", "Heat", "Moving", "Statistics", "Godfather", "Alien", "Matrix", "Ghosts", "Dune",
+             "Casablanca", "Avatar", "Stats", "Dolby", "Nights", "Part", "II", "of", "and", "Lost"]
+    tags = ["1080p", "720p", "BluRay", "x264", "REMUX", "DTS-HD", "mkv", "RARBG", "WEB", "HEVC", "AVC"]
+    names = []
+    for _ in range(count):
+        title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        year = rng.randint(1950, 2024)
+        if rng.random() < 0.3:
+            names.append(".".join([title.replace(" ", "."), str(year)] + rng.sample(tags, rng.randint(1, 3))))
+        else:
+            names.append(f"{title} ({year})")
+
+    classify = compile_folder_filter()
+    for label, test in (("Original regexes", legacy_classify), ("Compiled classifier", lambda name: classify(name) is None)):
+        start_time = time.perf_counter()
+        results = [test(name) for name in names]
+        elapsed = time.perf_counter() - start_time
+        print(f"{label}: {count / elapsed:,.0f} names/s ({elapsed:.2f} s), {sum(results):,} to move")
+
+    differences = [name for name in names if legacy_classify(name) != (classify(name) is None)]
+    print(f"{len(differences):,} names classified differently, e.g. {differences[:5]}")
+
+if __name__ == '__main__':
+    dest_options = [
+        "\\\\192.168.1.145\\e\\HD Movies", "\\\\192.168.1.145\\f\\HD Movies", "\\\\192.168.1.145\\j\\HD Movies",
+        "\\\\192.168.1.145\\k\\HD Movies", "\\\\192.168.1.145\\l\\HD Movies", "\\\\192.168.1.145\\m\\HD Movies",
+        "\\\\192.168.1.145\\n\\HD Movies", "\\\\192.168.1.145\\e\\Adult", "\\\\192.168.1.145\\f\\Adult",
+        "\\\\192.168.1.145\\j\\Adult", "\\\\192.168.1.145\\k\\Adult", "\\\\192.168.1.145\\l\\Adult",
+        "\\\\192.168.1.145\\m\\Adult", "\\\\192.168.1.145\\n\\Adult"
+    ]
+    parser = argparse.ArgumentParser(description="Move movie folders to the library drives.")
+    parser.add_argument("--benchmark", type=float, nargs='?', const=2, metavar="GB",
+                        help="Compare the copy engine with the original copy loop on files of this size (default: 2 GB).")
+    parser.add_argument("--benchmark-folder", help="Folder for the benchmark files (default: a temporary folder).")
+    parser.add_argument("--benchmark-classifier", type=int, nargs='?', const=1000000, metavar="NAMES",
+                        help="Time the folder name classifier on synthetic names (default: 1,000,000).")
+    parser.add_argument("--plan", nargs=2, metavar=("SOURCE", "DESTINATION"),
+                        help="Print what would be moved and why other folders are skipped, without moving anything.")
+    parser.add_argument("--auto-place", action="store_true",
+                        help="With --plan, spread the folders across every destination of the same kind by free space.")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_copy(args.benchmark, args.benchmark_folder)
+        sys.exit()
+
+    if args.benchmark_classifier:
+        benchmark_classifier(args.benchmark_classifier)
+        sys.exit()
+
+    if args.plan:
+        for line in format_plan(*args.plan, dest_options if args.auto_place else None):
+            print(line)
+        sys.exit()
+
+    root = tk.Tk()
+    root.title("Movie Transfer Utility")
+
+    frame = ttk.Frame(root, padding="10")
+    frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+    src_options = ["C:\\Holds", "C:\\Users\\bax11\\AppData\\Roaming\\Kodi\\userdata\\addon_data\\plugin.video.ezra\\Movies Downloads"]
+    src_combo = ttk.Combobox(frame, values=src_options, width=47)
+    src_combo.grid(row=0, column=0, sticky=tk.W)
+    src_combo.current(0)
+    src_button = ttk.Button(frame, text="Browse", command=lambda: browse_folder(src_combo))
+    src_button.grid(row=0, column=1)
+
+    dest_combo = ttk.Combobox(frame, values=dest_options, width=47)
+    dest_combo.grid(row=1, column=0, sticky=tk.W)
+    dest_combo.current(6)
+    dest_button = ttk.Button(frame, text="Browse", command=lambda: browse_folder(dest_combo))
+    dest_button.grid(row=1, column=1)
+
+    options_frame = ttk.Frame(frame)
+    options_frame.grid(row=0, column=2, rowspan=2, sticky=tk.W)
+    ttk.Label(options_frame, text="Parallel folders").grid(row=0, column=0, sticky=tk.W)
+    parallel_spinbox = ttk.Spinbox(options_frame, from_=1, to=16, width=4)
+    parallel_spinbox.set(max_concurrent_transfers)
+    parallel_spinbox.grid(row=0, column=1)
+    smallest_first_var = tk.BooleanVar(value=transfer_smallest_first)
+    ttk.Checkbutton(options_frame, text="Smallest first", variable=smallest_first_var).grid(row=1, column=0, columnspan=2, sticky=tk.W)
+    verify_var = tk.BooleanVar(value=verify_copies)
+    ttk.Checkbutton(options_frame, text="Verify copies", variable=verify_var).grid(row=2, column=0, columnspan=2, sticky=tk.W)
+    auto_place_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(options_frame, text="Auto-place across drives", variable=auto_place_var).grid(row=3, column=0, columnspan=2, sticky=tk.W)
+
+    execute_button = ttk.Button(frame, text="Execute", command=lambda: execute_in_thread(src_combo, dest_combo, progress_bar, progress_label, log_text, current_file_label,
+                                                                                         int(parallel_spinbox.get()), smallest_first_var.get(), verify_var.get(),
+                                                                                         dest_options if auto_place_var.get() else None))
+    execute_button.grid(row=2, column=0)
+
+    rename_button = ttk.Button(frame, text="Rename", command=lambda: execute_rename(src_combo, log_text))
+    rename_button.grid(row=2, column=1)
+
+    plan_button = ttk.Button(frame, text="Plan", command=lambda: show_plan(src_combo, dest_combo, log_text,
+                                                                            dest_options if auto_place_var.get() else None))
+    plan_button.grid(row=2, column=2)
+
+    progress_bar = ttk.Progressbar(frame, orient="horizontal", length=200, mode="determinate")
+    progress_bar.grid(row=3, column=0, columnspan=2)
+
+    progress_label = tk.Label(frame, text="0.0%")
+    progress_label.grid(row=3, column=2)
+
+    log_text = tk.Text(frame, height=10, width=80, bg="black", fg="lime green", font=("Arial", 12, "bold"))
+    log_text.grid(row=4, columnspan=3)
+
+    current_file_label = tk.Label(frame, text="Current File: ")
+    current_file_label.grid(row=5, columnspan=3)
+
+    root.mainloop()
 
 
 
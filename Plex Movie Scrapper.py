@@ -4,142 +4,570 @@ It looks at both the 'Movies' and 'Adult' sections in your Plex library.
 
 Here's what it does in detail:
 
-1. Connects to your Plex server using a URL and a token.
-2. Fetches the list of movies from both the 'Movies' and 'Adult' sections.
-3. For each movie, it gathers various details like the title, release year, runtime, rating, genre, and more.
-   It also finds out on which drive the movie is stored and what's its highest resolution.
+1. Connects to your Plex server using the URL and token in the PLEX_URL and PLEX_TOKEN environment variables.
+2. Fetches the movies of both the 'Movies' and 'Adult' sections, a page of plex_page_size movies per request.
+3. For each movie, it gathers various details like the title, release year, runtime, rating, genre, and more,
+   straight from those listings. It also finds out on which drive the movie is stored and what's its
+   highest resolution, the highest of its versions as analyzed by Plex. Only versions Plex hasn't analyzed
+   yet are probed with ffprobe; those results are cached in an SQLite file, so ffprobe only runs on new or
+   changed files.
 4. All this data is then organized into a table (DataFrame in Python terms).
 5. The script then moves any existing CSV files from a 'Current_List' folder to an 'Old_List' folder.
 6. A new CSV file is created in the 'Current_List' folder, containing the table of movie data.
 7. Finally, it generates some statistics about your movie collection, like how many movies you have in each rating category and genre. 
    These statistics are saved in another CSV file.
 
-To speed things up, it uses 'multiprocessing' to fetch details of multiple movies at the same time.
+To speed things up, the listings are fetched concurrently over one keep-alive connection pool with
+asyncio (needs the aiohttp package). Without aiohttp, or with --mode plexapi, plexapi fetches the listings.
+Either way ffprobe runs on several files at the same time, but on at most probe_per_drive files of the
+same drive, only reads the start of every file and is stopped after probe_timeout seconds.
+
+Run it with --benchmark to compare the old per-title lookups with the paged listings against a local
+stand-in Plex server (plex_stub_server.py) holding 20,000 movies.
 """
 
-from plexapi.server import PlexServer
 import pandas as pd
-from multiprocessing import freeze_support, Pool
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
 import math
+import ntpath
 import os
+import random
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
 from datetime import datetime
 import subprocess
 
-print("Imports loaded")
-
-PLEX_URL = BLOWME@DARREN.FAG
-TOKEN = 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
-print("Connecting to Plex server...")
-plex = PlexServer(PLEX_URL, TOKEN)
-print("Connected")
+print("Imports loaded")
 
-def fetch_section_movies(section_name):
+# The server and token come from the environment, so the token isn't stored in the script
+PLEX_URL = os.environ.get('PLEX_URL', 'http://127.0.0.1:32400')
+TOKEN = os.environ.get('PLEX_TOKEN', '')
+
+section_names = ['Movies', 'Adult']
+
+# Movies fetched per request when listing a section
+plex_page_size = 1000
+
+# asyncio mode: requests in flight at once (over one pooled keep-alive session), the per-request timeout
+# in seconds, and how often a failed request is retried, waiting plex_retry_backoff * 2^attempt seconds
+plex_concurrency = 8
+plex_request_timeout = 60
+plex_retries = 4
+plex_retry_backoff = 0.5
+
+# ffprobe processes run at once, in all and per drive (so one NAS disk isn't seeking for all of them)
+ffprobe_concurrency = 8
+probe_per_drive = 2
+# Seconds before a probe (e.g. of a file on a drive that stopped answering) is given up
+probe_timeout = 30
+# ffprobe only reads this many bytes / microseconds of a file to find its video stream, the container header
+probe_size = 5000000
+probe_analyze_duration = 2000000
+
+# ffprobe results are kept here, keyed by the Plex part id, size and updatedAt (or by the path, size and
+# mtime of the file), so a file is only probed again once it changes
+probe_cache_path = os.path.join(os.path.expanduser('~'), '.plex_scraper', 'ffprobe_cache.sqlite')
+
+def connect_to_plex(url=None, token=None):
+    # Only the plexapi mode and the benchmark need plexapi
+    from plexapi.server import PlexServer
+
+    print("Connecting to Plex server...")
+    plex = PlexServer(url or PLEX_URL, token or TOKEN)
+    print("Connected")
+    return plex
+
+def fetch_section_movies(plex, section_name, page_size=None):
+    """
+    Fetches every movie of a library section, page_size movies per request.
+
+    The listings already hold everything get_movie_metadata() needs, so the movies are told not to
+    reload themselves from the server one by one when a field is empty.
+
+    Returns:
+        dict: The movies keyed by ratingKey, in listing order; empty if the section can't be read.
+    """
+    page_size = page_size or plex_page_size
+    movies = {}
     try:
         section = plex.library.section(section_name)
-        movies = section.all()
-        return movies
+        start = 0
+        while True:
+            page = section.all(container_start=start, container_size=page_size, maxresults=page_size)
+            for movie in page:
+                movie._autoReload = False
+                movies[movie.ratingKey] = movie
+            print(f"{section_name}: {len(movies)} movies fetched")
+            if len(page) < page_size:
+                return movies
+            start += page_size
     except Exception as e:
         error_message = f"Error getting Plex {section_name} section: {e}"
         print(error_message)
-        return []
-
-print("Getting Movies section...")
-all_movies = fetch_section_movies('Movies')
-
-print("Getting Adult section...")
-adult_movies = fetch_section_movies('Adult')
-
-# Merge all_movies and adult_movies
-all_movies.extend(adult_movies)
-
-movie_titles = [movie.title for movie in all_movies]
-print(f"Total movies: {len(movie_titles)}")
+        return movies
 
-def map_resolution(resolution):
-    width, height = map(int, resolution.split('x'))
-    print(f"width: {width}, height: {height}")
-    
+def fetch_all_movies(plex):
+    """
+    Fetches the movies of every section in section_names, keyed by ratingKey.
+    """
+    movies = {}
+    for section_name in section_names:
+        print(f"Getting {section_name} section...")
+        movies.update(fetch_section_movies(plex, section_name))
+    print(f"Total movies: {len(movies)}")
+    return movies
+
+def resolution_name(width, height):
     if width >= 3840 and height >= 2160:
-        print("Resolution: 4K")
         return '4K'
     elif width >= 2560 and height >= 1440:
-        print("Resolution: 2K")
         return '2K'
     elif width >= 1920 and height >= 1080:
-        print("Resolution: 1080p")
         return '1080p'
     elif width >= 1280 and height >= 720:
-        print("Resolution: 720p")
         return '720p'
     else:
-        print("Resolution: SD")
         return 'SD'
 
-import subprocess
-
-import subprocess
-
-import subprocess
-
-def get_highest_resolution(file_path):
+def map_resolution(resolution):
+    width, height = map(int, resolution.split('x'))
+    print(f"width: {width}, height: {height}")
+    name = resolution_name(width, height)
+    print(f"Resolution: {name}")
+    return name
+
+def ffprobe_command(file_path):
+    return [
+        'ffprobe',
+        '-v', 'error',
+        '-probesize', str(probe_size),
+        '-analyzeduration', str(probe_analyze_duration),
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height',
+        '-of', 'csv=s=x:p=0',
+        file_path
+    ]
+
+def get_highest_resolution(file_path, timeout=None):
     try:
-        command = [
-            'ffprobe',
-            '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height',
-            '-of', 'csv=p=0',
-            file_path
-        ]
-        result = subprocess.check_output(command, encoding='utf-8')
-        output = result.strip()
+        command = ffprobe_command(file_path)
+        result = subprocess.run(command, capture_output=True, encoding='utf-8', timeout=timeout or probe_timeout, check=True)
+        output = result.stdout.strip().splitlines()[0].strip('x')
         print(f"Output: {output}")  # Added print statement for debugging
         return map_resolution(output)
+    except subprocess.TimeoutExpired:
+        print(f"Error getting resolution: ffprobe took more than {timeout or probe_timeout} s on {file_path}")
+        return 'N/A'
     except subprocess.CalledProcessError as e:
+        print(f"Error getting resolution: {e}: {e.stderr.strip()}")
+        return 'N/A'
+    except (OSError, IndexError, ValueError) as e:
         print(f"Error getting resolution: {e}")
         return 'N/A'
 
-get_highest_resolution("path/to/file.mp4")  # Added example usage for debugging
+def probe_drive(file_path):
+    """
+    Returns the drive (e.g. L: or \\\\server\\share) a file is on, as Plex reports its path, or its top folders
+    for a path without one (e.g. /mnt/disk3).
+    """
+    drive = ntpath.splitdrive(file_path)[0].upper()
+    return drive or "/".join(file_path.split("/")[:3])
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of some values, e.g. fraction=0.9 for p90.
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+def probe_files(file_paths, concurrency=None, per_drive=None, timeout=None):
+    """
+    Runs get_highest_resolution() on many files with a pool of threads, each waiting on its own ffprobe
+    process, and reports the probes/s and the latency percentiles of every drive.
+
+    Args:
+        file_paths (list): The files to probe.
+        concurrency (int): Probes running at once. Defaults to ffprobe_concurrency.
+        per_drive (int): Probes running at once on the same drive. Defaults to probe_per_drive.
+        timeout (float): Seconds before a probe is given up. Defaults to probe_timeout.
+
+    Returns:
+        list: The resolution of every file, 'N/A' where the probe failed or timed out.
+    """
+    if not file_paths:
+        return []
+    concurrency = concurrency or ffprobe_concurrency
+    per_drive = per_drive or probe_per_drive
+    drives = {}
+    for index, file_path in enumerate(file_paths):
+        drives.setdefault(probe_drive(file_path), []).append(index)
+    drive_slots = {drive: threading.Semaphore(per_drive) for drive in drives}
+    latencies = {drive: [] for drive in drives}
+
+    # Take the drives in turn, so the workers aren't all waiting on the slots of one drive
+    order = []
+    queues = [list(indexes) for indexes in drives.values()]
+    while queues:
+        order.extend(queue.pop(0) for queue in queues)
+        queues = [queue for queue in queues if queue]
+
+    def probe(index):
+        drive = probe_drive(file_paths[index])
+        with drive_slots[drive]:
+            start_time = time.perf_counter()
+            resolution = get_highest_resolution(file_paths[index], timeout)
+            latencies[drive].append(time.perf_counter() - start_time)
+        return resolution
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(concurrency, per_drive * len(drives))) as executor:
+        results = dict(zip(order, executor.map(probe, order)))
+    elapsed = time.perf_counter() - start_time
+
+    failed = sum(1 for resolution in results.values() if resolution == 'N/A')
+    print(f"ffprobe: {len(file_paths)} probes in {elapsed:.1f} s ({len(file_paths) / elapsed:.1f} probes/s), {failed} failed")
+    for drive, values in sorted(latencies.items()):
+        print(f"  {drive or '(no drive)'} - {len(values)} probes, latency p50 {percentile(values, 0.5):.2f} s, "
+              f"p90 {percentile(values, 0.9):.2f} s, p99 {percentile(values, 0.99):.2f} s")
+    return [results[index] for index in range(len(file_paths))]
+
+def open_probe_cache(path=None):
+    """
+    Opens (and creates if needed) the ffprobe result cache.
+
+    Args:
+        path (str): The cache file. Defaults to probe_cache_path.
+
+    Returns:
+        sqlite3.Connection: The connection to the cache database.
+    """
+    path = path or probe_cache_path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE IF NOT EXISTS probes (key TEXT PRIMARY KEY, resolution TEXT, probed_at REAL)")
+    return connection
+
+def probe_cache_key(file_path, part_id=None, part_size=None, updated_at=None):
+    """
+    Returns the cache key of a file: its Plex part id, size and updatedAt when Plex knows them, otherwise its
+    path, size and mtime. Returns None if neither is available (the file is then always probed).
+    """
+    if part_id is not None and updated_at is not None:
+        return f"part:{part_id}:{part_size}:{updated_at}"
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return f"file:{file_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+# Plex's videoResolution values, for media it has analyzed but whose width or height it didn't report
+plex_video_resolutions = {'4k': '4K', '2k': '2K', '1080': '1080p', '720': '720p', '576': 'SD', '480': 'SD', 'sd': 'SD'}
+
+# From lowest to highest, to pick the highest resolution of a movie
+resolution_order = ['SD', '720p', '1080p', '2K', '4K']
+
+def plex_media_resolution(width, height, video_resolution):
+    """
+    Returns the resolution of a version of a movie from what Plex knows about it, or None if Plex hasn't
+    analyzed it yet.
+    """
+    if width and height:
+        return resolution_name(int(width), int(height))
+    if video_resolution:
+        return plex_video_resolutions.get(str(video_resolution).lower())
+    return None
+
+def highest_resolution(resolutions):
+    """
+    Returns the highest of some resolutions, 'N/A' if none of them is known.
+    """
+    known = [resolution for resolution in resolutions if resolution in resolution_order]
+    return max(known, key=resolution_order.index) if known else 'N/A'
+
+def movie_media(movie):
+    """
+    Describes every version of a plexapi movie for plex_resolutions(): a (resolution or None, file path,
+    part id, part size, updatedAt) tuple each. Every part of a version has the resolution of the version, so
+    its first part stands for it.
+    """
+    updated_at = movie.updatedAt
+    if isinstance(updated_at, datetime):
+        updated_at = int(updated_at.timestamp())
+    versions = []
+    for media in movie.media:
+        if media.parts:
+            part = media.parts[0]
+            versions.append((plex_media_resolution(media.width, media.height, media.videoResolution),
+                             part.file, part.id, part.size, updated_at))
+    return versions
+
+def video_media(video):
+    """
+    movie_media() for a <Video> element of a section listing.
+    """
+    versions = []
+    for media in video.findall('Media'):
+        part = media.find('Part')
+        if part is not None:
+            versions.append((plex_media_resolution(media.get('width'), media.get('height'), media.get('videoResolution')),
+                             part.get('file'), part.get('id'), part.get('size'), video.get('updatedAt')))
+    return versions
+
+def lookup_probe_cache(cache, keys):
+    """
+    Returns the cached resolution of every key, None where there is none.
+    """
+    found = {}
+    known_keys = [key for key in keys if key]
+    for start in range(0, len(known_keys), 500):
+        chunk = known_keys[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        found.update(cache.execute(f"SELECT key, resolution FROM probes WHERE key IN ({placeholders})", chunk))
+    return [found.get(key) for key in keys]
+
+def store_probe_results(cache, keys, resolutions):
+    """
+    Saves ffprobe results in the cache. Failed probes ('N/A') aren't saved, so they are retried next run.
+    """
+    now = time.time()
+    with cache:
+        cache.executemany("INSERT OR REPLACE INTO probes (key, resolution, probed_at) VALUES (?, ?, ?)",
+                          [(key, resolution, now) for key, resolution in zip(keys, resolutions)
+                           if key and resolution != 'N/A'])
+
+def plex_resolutions(movies_data, media, use_cache=True):
+    """
+    Fills in the 'Highest Resolution' of every row from what Plex knows about its versions, and from the
+    ffprobe cache for the versions Plex hasn't analyzed yet.
+
+    Args:
+        movies_data (list): The rows.
+        media (list): The versions of every row, as described by movie_media() or video_media().
+        use_cache (bool): Read the cache; when False every version Plex hasn't analyzed is probed.
+
+    Returns:
+        list: A (row index, file path, cache key) tuple per version that still needs ffprobe.
+    """
+    to_probe = []
+    from_plex = 0
+    for index, (data, versions) in enumerate(zip(movies_data, media)):
+        data['Highest Resolution'] = highest_resolution([version[0] for version in versions])
+        for resolution, file_path, part_id, part_size, updated_at in versions:
+            if resolution:
+                from_plex += 1
+            else:
+                to_probe.append((index, file_path, probe_cache_key(file_path, part_id, part_size, updated_at)))
 
-import os
+    if use_cache and to_probe:
+        cache = open_probe_cache()
+        cached = lookup_probe_cache(cache, [key for index, file_path, key in to_probe])
+        cache.close()
+    else:
+        cached = [None] * len(to_probe)
+    missing = []
+    for (index, file_path, key), resolution in zip(to_probe, cached):
+        if resolution is None:
+            missing.append((index, file_path, key))
+        else:
+            data = movies_data[index]
+            data['Highest Resolution'] = highest_resolution([data['Highest Resolution'], resolution])
+    print(f"Resolutions: {from_plex} versions from Plex, {len(to_probe) - len(missing)} from the ffprobe cache, "
+          f"{len(missing)} to probe")
+    return missing
+
+def save_resolutions(movies_data, missing, probed, use_cache=True):
+    """
+    Merges the ffprobe results of the versions plex_resolutions() couldn't resolve into their rows, and caches them.
+    """
+    for (index, file_path, key), resolution in zip(missing, probed):
+        data = movies_data[index]
+        data['Highest Resolution'] = highest_resolution([data['Highest Resolution'], resolution])
+    if use_cache and missing:
+        cache = open_probe_cache()
+        store_probe_results(cache, [key for index, file_path, key in missing], probed)
+        cache.close()
+
+def movie_row(title, year, duration, content_rating, genre, file_path):
+    """
+    Builds the CSV row of a movie. The highest resolution is left empty; it's filled in afterwards.
+    """
+    runtime_minutes = math.ceil(duration / 60000)
+    drive_letter, full_path = os.path.splitdrive(file_path)
+    drive_letter = drive_letter.upper()
+
+    metadata = {
+        'Title': title,
+        'Year': year,
+        'Runtime': f"{runtime_minutes} minutes",
+        'Rating': content_rating,
+        'Genre': genre,
+        'Drive Letter': drive_letter,
+        'Highest Resolution': None,
+        'Full Path': full_path
+    }
 
-def get_movie_metadata(title):
+    print(f"Metadata for movie {title}: {metadata}")
+    return metadata
+
+def get_movie_metadata(movie):
+    """
+    Builds the CSV row of a movie from its section listing, without asking the server anything.
+    """
+    title = movie.title
     try:
-        movie = plex.library.section('Movies').get(title)
-        runtime_minutes = math.ceil(movie.duration / 60000)
-        drive_letter, full_path = os.path.splitdrive(movie.media[0].parts[0].file)
-        drive_letter = drive_letter.upper()
-        highest_resolution = get_highest_resolution(full_path)
-
-        metadata = {
-            'Title': movie.title,
-            'Year': movie.year,
-            'Runtime': f"{runtime_minutes} minutes",
-            'Rating': movie.contentRating,
-            'Genre': movie.genres[0].tag if movie.genres else '',
-            'Drive Letter': drive_letter,
-            'Highest Resolution': highest_resolution,
-            'Full Path': full_path
-        }
-
-        print(f"Metadata for movie {title}: {metadata}")
-        return metadata
+        return movie_row(movie.title, movie.year, movie.duration, movie.contentRating,
+                         movie.genres[0].tag if movie.genres else '', movie.media[0].parts[0].file)
     except Exception as e:
         print(f"Error getting metadata for movie {title}: {e}")
         return None
 
-import pandas as pd
-from datetime import datetime
-import os
-
-import pandas as pd
-import os
-from datetime import datetime
+def get_movie_metadata_xml(video):
+    """
+    get_movie_metadata() for a <Video> element of a section listing, as fetched in the asyncio mode.
+    """
+    title = video.get('title')
+    try:
+        genre = video.find('Genre')
+        year = video.get('year')
+        return movie_row(title, int(year) if year else None, int(video.get('duration')), video.get('contentRating'),
+                         genre.get('tag') if genre is not None else '', video.find('Media/Part').get('file'))
+    except Exception as e:
+        print(f"Error getting metadata for movie {title}: {e}")
+        return None
 
-import pandas as pd
-from datetime import datetime
-import os
+async def fetch_plex_xml(session, semaphore, path, params=None):
+    """
+    Fetches a Plex URL and parses the XML it returns.
+
+    Connection errors, timeouts and 429/5xx responses are retried plex_retries times with exponential
+    backoff (plus jitter, so parallel requests don't retry in lockstep).
+
+    Args:
+        session (aiohttp.ClientSession): The shared session.
+        semaphore (asyncio.Semaphore): Bounds the requests in flight.
+        path (str): The path on the server, e.g. /library/sections.
+        params (dict): Query parameters.
+
+    Returns:
+        xml.etree.ElementTree.Element: The MediaContainer element.
+    """
+    for attempt in range(plex_retries + 1):
+        try:
+            async with semaphore:
+                async with session.get(path, params=params) as response:
+                    response.raise_for_status()
+                    body = await response.read()
+            return ET.fromstring(body)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status == 429 or e.status >= 500
+            if not retryable or attempt == plex_retries:
+                raise
+            delay = plex_retry_backoff * 2 ** attempt * (0.5 + random.random())
+            print(f"Retrying {path} in {delay:.1f} s after error: {e!r}")
+            await asyncio.sleep(delay)
+
+async def fetch_section_movies_async(session, semaphore, section_key, section_name, page_size=None):
+    """
+    fetch_section_movies() for the asyncio mode: the first page gives the section size, then all the other
+    pages are fetched concurrently.
+
+    Returns:
+        dict: The <Video> elements keyed by ratingKey, in listing order.
+    """
+    page_size = page_size or plex_page_size
+    path = f"/library/sections/{section_key}/all"
+
+    def page_params(start):
+        return {'type': 1, 'X-Plex-Container-Start': start, 'X-Plex-Container-Size': page_size}
+
+    first_page = await fetch_plex_xml(session, semaphore, path, page_params(0))
+    total_size = int(first_page.get('totalSize') or first_page.get('size') or 0)
+    other_pages = await asyncio.gather(*(fetch_plex_xml(session, semaphore, path, page_params(start))
+                                         for start in range(page_size, total_size, page_size)))
+    movies = {}
+    for page in [first_page] + list(other_pages):
+        for video in page.findall('Video'):
+            movies[video.get('ratingKey')] = video
+    print(f"{section_name}: {len(movies)} movies fetched")
+    return movies
+
+async def fetch_movie_rows_async(url, token, concurrency=None):
+    """
+    Fetches the rows of every movie in section_names with one pooled keep-alive session.
+
+    Args:
+        url (str): The Plex server URL.
+        token (str): The Plex token.
+        concurrency (int): Requests in flight at once. Defaults to plex_concurrency.
+
+    Returns:
+        list: A (row, <Video> element) pair per movie; the rows are built by movie_row().
+    """
+    concurrency = concurrency or plex_concurrency
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    headers = {'X-Plex-Token': token, 'Accept': 'application/xml'}
+    timeout = aiohttp.ClientTimeout(total=plex_request_timeout)
+    async with aiohttp.ClientSession(url, headers=headers, connector=connector, timeout=timeout) as session:
+        sections = await fetch_plex_xml(session, semaphore, '/library/sections')
+        section_keys = {directory.get('title'): directory.get('key') for directory in sections.findall('Directory')}
+        for section_name in section_names:
+            if section_name not in section_keys:
+                print(f"Error getting Plex {section_name} section: no such section")
+        results = await asyncio.gather(*(fetch_section_movies_async(session, semaphore, section_keys[section_name], section_name)
+                                         for section_name in section_names if section_name in section_keys))
+
+    movies = {}
+    for section_movies in results:
+        movies.update(section_movies)
+    print(f"Total movies: {len(movies)}")
+    rows = [(get_movie_metadata_xml(video), video) for video in movies.values()]
+    return [(row, video) for row, video in rows if row is not None]
+
+async def scrape_library_async(url, token, use_cache=True):
+    """
+    Fetches every movie row and fills in its resolution, in one process.
+    """
+    rows = await fetch_movie_rows_async(url, token)
+    movies_data = [row for row, video in rows]
+    print("Metadata extracted")
+
+    print("Getting resolutions...")
+    missing = plex_resolutions(movies_data, [video_media(video) for row, video in rows], use_cache)
+    probed = await asyncio.to_thread(probe_files, [file_path for index, file_path, key in missing])
+    save_resolutions(movies_data, missing, probed, use_cache)
+    print("Resolutions extracted")
+    return movies_data
+
+def scrape_library_with_plexapi(use_cache=True):
+    """
+    Fetches every movie row with plexapi and fills in its resolution, probing what Plex hasn't analyzed with
+    probe_files().
+    """
+    plex = connect_to_plex()
+    all_movies = fetch_all_movies(plex)
+
+    print("Extracting metadata...")
+    rows = [(get_movie_metadata(movie), movie) for movie in all_movies.values()]
+    rows = [(data, movie) for data, movie in rows if data is not None]
+    movies_data = [data for data, movie in rows]
+    print("Metadata extracted")
+
+    missing = plex_resolutions(movies_data, [movie_media(movie) for data, movie in rows], use_cache)
+    print("Getting resolutions in parallel...")
+    probed = probe_files([file_path for index, file_path, key in missing])
+    save_resolutions(movies_data, missing, probed, use_cache)
+    print("Resolutions extracted")
+    return movies_data
 
 def generate_movie_stats(df):
     rating_columns = ['X', 'NC-17', 'R', 'NR', 'PG-13', 'PG', 'G']
@@ -181,19 +609,78 @@ def generate_movie_stats(df):
     
     print(f"Movie stats saved to {stats_file_path}")
 
-if __name__ == '__main__':
-    print("Initializing multiprocessing...")
-    freeze_support()
+def benchmark_metadata(movie_count=20000, sample=200):
+    """
+    Compares the old per-title lookups with the paged section listings (plexapi, and asyncio when aiohttp is
+    installed) against plex_stub_server.py.
+
+    The per-title lookups are timed on the first sample titles and scaled up to movie_count.
+
+    Args:
+        movie_count (int): The number of movies in the stand-in library.
+        sample (int): The number of titles looked up one by one.
+
+    Returns:
+        None
+    """
+    from plex_stub_server import start_stub_server
+
+    server = start_stub_server(movie_count)
+    plex = connect_to_plex(server.url, 'stub')
+
+    titles = [movie['title'] for movie in server.library[1][:sample]]
+    requests_before = server.request_count
+    start_time = time.perf_counter()
+    for title in titles:
+        plex.library.section('Movies').get(title)
+    elapsed = time.perf_counter() - start_time
+    requests = server.request_count - requests_before
+    per_title = (requests / len(titles), elapsed / len(titles))
+
+    requests_before = server.request_count
+    start_time = time.perf_counter()
+    movies = fetch_all_movies(plex)
+    rows = [get_movie_metadata(movie) for movie in movies.values()]
+    paged_elapsed = time.perf_counter() - start_time
+    paged_requests = server.request_count - requests_before
+
+    if aiohttp:
+        requests_before = server.request_count
+        start_time = time.perf_counter()
+        async_rows = asyncio.run(fetch_movie_rows_async(server.url, 'stub'))
+        async_elapsed = time.perf_counter() - start_time
+        async_requests = server.request_count - requests_before
+    server.shutdown()
+
+    print(f"\nPer-title lookups: {requests} requests in {elapsed:.2f} s for {len(titles)} titles, "
+          f"about {per_title[0] * movie_count:,.0f} requests and {per_title[1] * movie_count:.0f} s for {movie_count:,} "
+          f"(and 'Adult' titles aren't found)")
+    print(f"Paged listings: {paged_requests} requests in {paged_elapsed:.2f} s for {len(rows):,} movies")
+    if aiohttp:
+        print(f"Paged listings, asyncio: {async_requests} requests in {async_elapsed:.2f} s for {len(async_rows):,} movies")
 
-    print("Creating multiprocessing pool...")
-    pool = Pool(processes=32)
-    print("Pool created")
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the Plex movie list and stats to CSV.")
+    parser.add_argument("--benchmark", type=int, nargs='?', const=20000, metavar="MOVIES",
+                        help="Benchmark fetching the metadata from a local stand-in Plex server (default: 20000 movies).")
+    parser.add_argument("--mode", choices=["async", "plexapi"], default="async" if aiohttp else "plexapi",
+                        help="async: one process with asyncio and aiohttp (default when aiohttp is installed); "
+                             "plexapi: plexapi, one request at a time.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Probe every file Plex hasn't analyzed, without reading or updating the ffprobe cache.")
+    args = parser.parse_args()
+    if args.mode == 'async' and not aiohttp:
+        parser.error("--mode async needs the aiohttp package (pip install aiohttp)")
+
+    if args.benchmark:
+        benchmark_metadata(args.benchmark)
+        exit()
 
-    print("Extracting metadata in parallel...")
     try:
-        movies_data = pool.map(get_movie_metadata, movie_titles)
-        movies_data = [data for data in movies_data if data is not None]
-        print("Metadata extracted")
+        if args.mode == 'async':
+            movies_data = asyncio.run(scrape_library_async(PLEX_URL, TOKEN, not args.no_cache))
+        else:
+            movies_data = scrape_library_with_plexapi(not args.no_cache)
     except Exception as e:
         print(f"Error extracting movie metadata: {e}")
         exit()
@@ -4,6 +4,14 @@ import shutil
 import tkinter as tk
 from tkinter import filedialog
 
+# Renames movie folders to "Title (Year)". Run it to pick a folder, or import it (Folder Mover Deluxe
+# does) and call rename_folders(directory_path), which returns what happened to every folder.
+
+movie_extensions = ('.mov', '.mkv', '.m4k', '.mp4', '.avi', '.mpg', '.mpeg', '.m4v', '.wmv', '.ts', '.m2ts', '.flv', '.divx')
+
+year_pattern = re.compile(r'\b\d{4}\b')
+punctuation_pattern = re.compile(r'[^\w\s]')
+
 def is_file_open(file_path):
     try:
         with open(file_path, 'a', os.O_EXCL) as file:
@@ -13,81 +21,99 @@ def is_file_open(file_path):
         print(f"Error opening file: {e}")
         return True
 
-def rename_folder(folder_name, directory_path, movie_extensions):
+def new_folder_name_for(folder_name):
+    """
+    Returns the "Title (Year)" name for a folder name, or None if it contains no year.
+    """
+    year_match = year_pattern.search(folder_name)
+    if not year_match:
+        return None
+    movie_name = ' '.join(punctuation_pattern.sub(' ', folder_name[:year_match.start()]).split())
+    return f"{movie_name} ({year_match.group()})"
+
+def rename_folder(folder_name, directory_path, movie_extensions=movie_extensions):
     folder_path = os.path.join(directory_path, folder_name)
     
     # Check if folder is empty
-    if not os.listdir(folder_path):
-        print(f"Skipping empty folder {folder_name}")
-        return 'skip', folder_name, None
+    with os.scandir(folder_path) as entries:
+        if next(entries, None) is None:
+            print(f"Skipping empty folder {folder_name}")
+            return 'skip', folder_name, None
 
-    year_match = re.search(r'\b\d{4}\b', folder_name)
-    if not year_match:
+    new_folder_name = new_folder_name_for(folder_name)
+    if not new_folder_name:
         print(f"Skipping folder: {folder_name} because it does not contain a year.")
         return 'skip', folder_name, None
 
-    year = year_match.group()
-    movie_name = re.sub(r'[^\w\s]', ' ', folder_name[:year_match.start()]).strip()
-    movie_name = ' '.join(movie_name.split())
-    new_folder_name = f"{movie_name} ({year})"
-    
+    # Already named right: nothing to check or do
+    if folder_name == new_folder_name:
+        return 'skip', folder_name, None
+
     new_folder_path = os.path.join(directory_path, new_folder_name)
     if os.path.exists(new_folder_path):
         print(f"Warning: {new_folder_name} already exists. Skipping.")
         return 'skip', folder_name, None
 
-    contains_movie = False
+    movie_extensions = tuple(movie_extensions)
     for root, _, files in os.walk(folder_path):
         for file in files:
-            if any(file.endswith(ext) for ext in movie_extensions):
+            if file.endswith(movie_extensions):
                 file_path = os.path.join(root, file)
                 if is_file_open(file_path):
                     print(f"Skipping folder: {folder_name} because {file} is still open or being written to.")
                     return 'file_open', folder_name, None
-                contains_movie = True
                 break
-        if contains_movie:
-            break
-    
-    if folder_name != new_folder_name:
-        try:
-            os.rename(folder_path, new_folder_path)
-            print(f"Renaming folder: {folder_name} to {new_folder_name}.")
-            return 'rename', folder_name, new_folder_name
-        except PermissionError:
-            print(f"Skipping folder: {folder_name} due to permission error")
-            return 'permission_error', folder_name, None
-    
-    if not contains_movie:
-        return 'no_movie', folder_name, None
-    
-    return 'skip', folder_name, None
+        else:
+            continue
+        break
 
-if __name__ == '__main__':
-    def rename_folders(directory_path):
-        renamed_count = 0
-        skipped_count = 0
-        movie_extensions = ['.mov', '.mkv', '.m4k', '.mp4', '.avi', '.mpg', '.mpeg', '.m4v', '.wmv', '.ts', '.m2ts', '.flv', '.divx']
-        
-        folder_names = [name for name in os.listdir(directory_path) if os.path.isdir(os.path.join(directory_path, name))]
-
-        for folder_name in folder_names:
-            status, old_name, new_name = rename_folder(folder_name, directory_path, movie_extensions)
-            
-            if status == 'rename':
-                print(f"Renamed: {old_name} -> {new_name}")
-                renamed_count += 1
-            elif status == 'skip':
-                print(f"Skipped: {old_name} (already in correct format or unrecognizable pattern)")
-                skipped_count += 1
-            elif status == 'permission_error':
-                skipped_count += 1
-            elif status == 'file_open':
-                skipped_count += 1
-        
-        print(f"\nTotal folders renamed: {renamed_count}")
-        print(f"Total folders skipped: {skipped_count}")
+    try:
+        os.rename(folder_path, new_folder_path)
+        print(f"Renaming folder: {folder_name} to {new_folder_name}.")
+        return 'rename', folder_name, new_folder_name
+    except PermissionError:
+        print(f"Skipping folder: {folder_name} due to permission error")
+        return 'permission_error', folder_name, None
+
+def rename_folders(directory_path, movie_extensions=movie_extensions):
+    """
+    Renames every folder of a directory to "Title (Year)".
+
+    Args:
+        directory_path (str): The directory whose folders are renamed.
+        movie_extensions (tuple): The extensions of movie files; a folder whose movie file is still open is skipped.
+
+    Returns:
+        list: A (status, old name, new name) tuple per folder, as returned by rename_folder(). The status is
+        'rename', 'skip', 'file_open' or 'permission_error'; the new name is None unless it was renamed.
+    """
+    renamed_count = 0
+    skipped_count = 0
+    results = []
 
+    with os.scandir(directory_path) as entries:
+        folder_names = [entry.name for entry in entries if entry.is_dir()]
+
+    for folder_name in folder_names:
+        status, old_name, new_name = rename_folder(folder_name, directory_path, movie_extensions)
+        results.append((status, old_name, new_name))
+
+        if status == 'rename':
+            print(f"Renamed: {old_name} -> {new_name}")
+            renamed_count += 1
+        elif status == 'skip':
+            print(f"Skipped: {old_name} (already in correct format or unrecognizable pattern)")
+            skipped_count += 1
+        elif status == 'permission_error':
+            skipped_count += 1
+        elif status == 'file_open':
+            skipped_count += 1
+
+    print(f"\nTotal folders renamed: {renamed_count}")
+    print(f"Total folders skipped: {skipped_count}")
+    return results
+
+if __name__ == '__main__':
     root = tk.Tk()
     root.withdraw()
 
@@ -0,0 +1,212 @@
+"""
+A stand-in for a Plex Media Server, for testing and benchmarking Plex Movie Scrapper without touching the
+real server.
+
+It serves a generated library with a 'Movies' and an 'Adult' section through the few endpoints the scraper
+uses: the server root, /library/sections, the paged section listings (/library/sections/<key>/all, with
+X-Plex-Container-Start/Size as headers or parameters, and the 'title' filter) and /library/metadata/<keys>.
+Every movie has one or two versions (Media) with one or two files (Part); a few have not been analyzed
+by Plex yet, so they have no width, height or videoResolution. Every request is counted.
+
+Run it on its own to point the scraper at it:
+
+    python plex_stub_server.py --movies 20000 --port 32401
+    set PLEX_URL=http://127.0.0.1:32401
+    set PLEX_TOKEN=stub
+
+or start it from code with start_stub_server().
+"""
+
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import quoteattr
+
+section_titles = {1: 'Movies', 2: 'Adult'}
+
+title_words = ["The", "Last", "Night", "City", "Heat", "Alien", "Ghost", "Matrix", "River", "Storm", "Empire",
+               "Shadow", "Return", "Dark", "Blue", "Iron", "Lost", "Star", "King", "Road"]
+genres = ["Action", "Drama", "Comedy", "Thriller", "Horror", "Science Fiction", "Romance", "Animation"]
+content_ratings = ["R", "PG-13", "PG", "G", "NR", "NC-17", "X", "TV-MA"]
+resolutions = [(3840, 2160, "4k"), (1920, 1080, "1080"), (1280, 720, "720"), (720, 480, "480")]
+drives = ["E", "F", "J", "K", "L", "M", "N"]
+
+def generate_library(movie_count=20000, adult_fraction=0.1, unanalyzed_fraction=0.05, seed=0):
+    """
+    Generates the movies of the stub library.
+
+    Args:
+        movie_count (int): The number of movies across both sections.
+        adult_fraction (float): The share of the movies in the 'Adult' section.
+        unanalyzed_fraction (float): The share of the movies Plex hasn't analyzed (no resolution).
+        seed (int): The random seed, so runs are repeatable.
+
+    Returns:
+        dict: Section key -> list of movie dicts.
+    """
+    rng = random.Random(seed)
+    library = {key: [] for key in section_titles}
+    part_id = 0
+    for index in range(movie_count):
+        rating_key = index + 1
+        section_key = 2 if rng.random() < adult_fraction else 1
+        title = " ".join(rng.sample(title_words, rng.randint(1, 3))) + f" {rating_key}"
+        year = rng.randint(1950, 2024)
+        folder = f"{'Adult' if section_key == 2 else 'HD Movies'}\\{title} ({year})"
+        analyzed = rng.random() >= unanalyzed_fraction
+        drive = rng.choice(drives)
+        media = []
+        for version in range(1 if rng.random() < 0.9 else 2):
+            width, height, video_resolution = rng.choice(resolutions)
+            parts = []
+            for part in range(1 if rng.random() < 0.95 else 2):
+                part_id += 1
+                parts.append({'id': part_id, 'size': rng.randint(1, 60) * 1024 ** 3,
+                              'file': f"{drive}:\\{folder}\\{title} {version + 1}-{part + 1}.mkv"})
+            media.append({'id': rating_key * 10 + version, 'width': width if analyzed else None,
+                          'height': height if analyzed else None,
+                          'videoResolution': video_resolution if analyzed else None, 'parts': parts})
+        library[section_key].append({
+            'ratingKey': rating_key, 'title': title, 'year': year,
+            'duration': rng.randint(80, 180) * 60000, 'contentRating': rng.choice(content_ratings),
+            'genres': rng.sample(genres, rng.randint(0, 2)), 'updatedAt': 1700000000 + rating_key,
+            'media': media,
+        })
+    return library
+
+def attributes(**values):
+    """
+    Renders XML attributes, leaving out the ones that are None.
+    """
+    return "".join(f" {name}={quoteattr(str(value))}" for name, value in values.items() if value is not None)
+
+def movie_xml(movie, section_key):
+    """
+    Renders a movie as the <Video> element of a Plex listing.
+    """
+    media_xml = []
+    for media in movie['media']:
+        parts_xml = "".join("<Part" + attributes(id=part['id'], key="/library/parts/%d/file.mkv" % part['id'],
+                                                 file=part['file'], size=part['size'], container='mkv') + " />"
+                            for part in media['parts'])
+        media_attributes = attributes(id=media['id'], duration=movie['duration'], width=media['width'],
+                                      height=media['height'], videoResolution=media['videoResolution'], container='mkv')
+        media_xml.append(f"<Media{media_attributes}>{parts_xml}</Media>")
+    genres_xml = "".join(f"<Genre{attributes(tag=genre)} />" for genre in movie['genres'])
+    video_attributes = attributes(ratingKey=movie['ratingKey'], key="/library/metadata/%d" % movie['ratingKey'],
+                                  type='movie', title=movie['title'], year=movie['year'], duration=movie['duration'],
+                                  contentRating=movie['contentRating'], updatedAt=movie['updatedAt'],
+                                  librarySectionID=section_key, librarySectionTitle=section_titles[section_key])
+    return f"<Video{video_attributes}>{''.join(media_xml)}{genres_xml}</Video>"
+
+class PlexStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_xml(self, body, status=200):
+        data = ('<?xml version="1.0" encoding="UTF-8"?>\n' + body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml;charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        if server.delay:
+            time.sleep(server.delay)
+
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        path = url.path.rstrip('/') or '/'
+        parts = path.strip('/').split('/')
+
+        if path in ('/', '/identity'):
+            self.send_xml(f"<MediaContainer{attributes(size=0, friendlyName='Plex stub', machineIdentifier='plex-stub', version='1.40.0.0', platform='Stub', myPlex=0)} />")
+        elif path == '/library':
+            self.send_xml(f"<MediaContainer{attributes(size=1, title1='Plex Library')}><Directory key=\"sections\" title=\"Library Sections\" /></MediaContainer>")
+        elif path == '/library/sections':
+            directories = "".join("<Directory" + attributes(key=key, title=title, type='movie', agent='tv.plex.agents.movie',
+                                                            scanner='Plex Movie', language='en-US', uuid="section-%d" % key) + " />"
+                                  for key, title in section_titles.items())
+            self.send_xml(f"<MediaContainer{attributes(size=len(section_titles))}>{directories}</MediaContainer>")
+        elif len(parts) == 4 and parts[:2] == ['library', 'sections'] and parts[3] == 'all' and parts[2].isdigit() and int(parts[2]) in server.library:
+            self.send_listing(int(parts[2]), params)
+        elif len(parts) == 3 and parts[:2] == ['library', 'metadata']:
+            keys = [int(key) for key in unquote(parts[2]).split(',') if key.isdigit()]
+            found = [server.movies[key] for key in keys if key in server.movies]
+            if not found:
+                self.send_xml("<MediaContainer size=\"0\" />", 404)
+                return
+            videos = "".join(movie_xml(movie, section_key) for section_key, movie in found)
+            self.send_xml(f"<MediaContainer{attributes(size=len(found))}>{videos}</MediaContainer>")
+        else:
+            self.send_xml("<MediaContainer size=\"0\" />", 404)
+
+    def send_listing(self, section_key, params):
+        movies = self.server.library[section_key]
+        title = params.get('title')
+        if title:
+            movies = [movie for movie in movies if title.lower() in movie['title'].lower()]
+
+        start = self.headers.get('X-Plex-Container-Start', params.get('X-Plex-Container-Start'))
+        size = self.headers.get('X-Plex-Container-Size', params.get('X-Plex-Container-Size'))
+        offset = int(start or 0)
+        page = movies[offset:offset + int(size)] if size is not None else movies[offset:]
+
+        xml_cache = self.server.xml_cache
+        videos = "".join(xml_cache[movie['ratingKey']] for movie in page)
+        container = attributes(size=len(page), totalSize=len(movies) if start is not None else None, offset=offset,
+                               librarySectionID=section_key, librarySectionTitle=section_titles[section_key],
+                               viewGroup='movie', identifier='com.plexapp.plugins.library')
+        self.send_xml(f"<MediaContainer{container}>{videos}</MediaContainer>")
+
+def start_stub_server(movie_count=20000, port=0, delay=0.0, seed=0):
+    """
+    Starts the stub server on a background thread.
+
+    Args:
+        movie_count (int): The number of movies in the library.
+        port (int): The port to listen on; 0 picks a free one.
+        delay (float): Seconds added to every response, to mimic a server further away.
+        seed (int): The random seed of the library.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its url, library and request_count attributes describe it;
+        call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), PlexStubHandler)
+    server.daemon_threads = True
+    server.library = generate_library(movie_count, seed=seed)
+    server.movies = {movie['ratingKey']: (section_key, movie)
+                     for section_key, movies in server.library.items() for movie in movies}
+    server.xml_cache = {rating_key: movie_xml(movie, section_key) for rating_key, (section_key, movie) in server.movies.items()}
+    server.request_count = 0
+    server.lock = threading.Lock()
+    server.delay = delay
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a generated library the way a Plex Media Server would.")
+    parser.add_argument("--movies", type=int, default=20000, help="Number of movies (default: 20000).")
+    parser.add_argument("--port", type=int, default=32401, help="Port to listen on (default: 32401).")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds added to every response (default: 0).")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.movies, args.port, args.delay)
+    print(f"Plex stub serving {args.movies} movies at {server.url} (any token works). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"{server.request_count} requests served")
+        server.shutdown()